@@ -1,7 +1,22 @@
+import bisect
+import codecs
+import functools
+import hashlib
+import heapq
+import json
 import random
+import re
 import requests
 import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from requests.adapters import HTTPAdapter
 
 DISCORD_BOT_TOKEN = os.environ.get('DISCORD_BOT_TOKEN')
 WEBHOOK_URL_CHAT = os.environ.get('WEBHOOK_URL_CHAT')  # Webhook URL for sending messages
@@ -12,66 +27,1071 @@ PLAYER_NAME = os.environ.get('PLAYER_NAME')  # Player name for getting the leade
 TEAM_ID = os.environ.get('TEAM_ID')  # Team ID for getting the leaderboard rank
 TEAM_TAG = os.environ.get('TEAM_TAG')  # Team tag for getting the leaderboard rank
 COUNTRY_CODE = os.environ.get('COUNTRY_CODE')  # Country code for getting the leaderboard rank
+TRACKED_PLAYERS = os.environ.get('TRACKED_PLAYERS')  # JSON list (or path to a JSON file) of players to track
+
+LEADERBOARD_URL = os.environ.get('LEADERBOARD_URL', "https://www.dota2.com/webapi/ILeaderboard/GetDivisionLeaderboard/v0001?division={division}&leaderboard=0")
+DISCORD_API_URL = os.environ.get('DISCORD_API_URL', "https://discord.com/api/v9")  # Overridden to point at a local stand-in for benchmarks
+ALL_DIVISIONS = ["europe", "americas", "se_asia", "china"]
+DIVISIONS = os.environ.get('DIVISIONS', 'europe')  # Comma separated divisions to scan, or "all"
+STREAM_CHUNK_SIZE = 16 * 1024  # Bytes read at a time when streaming the leaderboard
+HTTP_TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', 10))  # Seconds to connect, and between bytes read, before a request fails
+STATE_DIR = os.environ.get('STATE_DIR', '/tmp')  # Writable directory for local state, /tmp survives warm Lambda invocations
+STATE_STORE = os.environ.get('STATE_STORE', 'file')  # "file" (JSON files in STATE_DIR) or "dynamodb:<table name>"
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR')  # Directory of the leaderboard archive, archiving is off when unset
+RANK_TIERS_FILE = os.environ.get('RANK_TIERS_FILE')  # JSON file overriding DEFAULT_RANK_TIERS
+RANK_STATE_MAX_AGE = int(os.environ.get('RANK_STATE_MAX_AGE', 6 * 3600))  # Seconds before the stored rank is checked against the channel again
+QUIET_HOURS = os.environ.get('QUIET_HOURS', '0-8')  # "start-end" hours, both inclusive (may wrap, e.g. "22-6"), without updates; empty for none
+ADAPTIVE_POLLING = os.environ.get('ADAPTIVE_POLLING', '1') != '0'  # Poll the leaderboard only around its scheduled reposts, "0" to poll on every update
+POLL_AFTER_REPOST = float(os.environ.get('POLL_AFTER_REPOST', 5))  # Seconds after the scheduled repost to poll
+POLL_BACKOFF_BASE = float(os.environ.get('POLL_BACKOFF_BASE', 10))  # Seconds before polling again when a repost is late, doubled every miss
+POLL_MAX_INTERVAL = float(os.environ.get('POLL_MAX_INTERVAL', 900))  # Longest wait between polls, bounds the cost of a wrong schedule
+LEADERBOARD_EVENTS_MIN_CHANGE = int(os.environ.get('LEADERBOARD_EVENTS_MIN_CHANGE') or 0) or None  # Ranks a player has to move for a leaderboard event; unset, empty or 0 to not diff leaderboards
+LEADERBOARD_EVENTS_WATCH = os.environ.get('LEADERBOARD_EVENTS_WATCH', 'tracked')  # "tracked" for events about the tracked players only, "all" for everyone
+WEBHOOK_URL_EVENTS = os.environ.get('WEBHOOK_URL_EVENTS') or None  # Webhook URL for leaderboard events, events are only diffed when set (never the rank log webhook)
+
+MAX_EVENT_LINES = 20  # Leaderboard events posted per update, the rest are counted
+
+# Player tracked when TRACKED_PLAYERS is not set
+DEFAULT_PLAYER = {
+    "label": "andrei",
+    "name": "legacy ",
+    "team_id": 9017851,
+    "team_tag": "Plasma",
+    "country": "ro",
+}
 
 positive_emojis = ["🏆", "👑", "💰", "🪙", "💵", "👙", "🤤", "🔥", "💯", "👆"]
 negative_emojis = ["🚫🏠", "😔", "💐","🪦", "💀", "💩"]
 
+# Flavour text per rank, a rank gets the text of the first threshold it is at or below
+DEFAULT_RANK_TIERS = [
+    (10, "Ai terminat DOTA, bravo!"),
+    (50, "THE GOD OF DOTA"),
+    (75, "Tatal tau este mandru de tine!"),
+    (100, "He is locked in, he takes no prisoners, there is no one to tell the tale..."),
+    (125, '⚡⚡⚡⚡"I AM THE ONE WHO KNOCKS"⚡⚡⚡⚡'),
+    (150, "HE IS LOCKED THE FUCK IN"),
+    (175, "ARMED AND DANGEROUS! AGAIN!! AGAIN!!! AGAIN!!!! 🔫🔫🔫"),
+    (200, "HELL UNLEASHED!!!!"),
+    (225, "Time is a flat circle and you are on top of it🔥🔥🔥"),
+    (250, "KING VON N-A MURIT 🔫🔫🔫🔫🔫🔫"),
+    (275, "BAI NENE PUMNU MEU BETON ARMAT ZICI CA-I TORPILA DE TANC"),
+    (300, "CE LE FACI COPILEEEEEEEEEEEEEEEEEEE"),
+    (325, "CAN ANYBODY STOP THIS OUTRAGEOUS MAN???!!!!"),
+    (350, "Hai andreie da in pula mea drumu la brate ce cacat faci?!!!"),
+    (375, "Coaie adormim aici 🛌"),
+    (400, "Pentru asta n ai vrut sa mergi la sala? Pentru asta n ai vrut sa mergem la cabane?"),
+    (450, "HAAAI COAEEE CA NE AI BAGAT PE TOTI IN SCAUNEEEEEEE"),
+    (500, "Game of thrones Season 8, Mihai dupa 2020, Andrei dupa liceu"),
+    (550, "At this point lasa-l pe gabi sa joace in locu tau"),
+    (600, "Sa-i fie tarana usoara💀💀💀💀"),
+    (625, "BA ESTI PROST, CE FACI CU VIATA TA?"),
+    (650, "Nici gagica n-ai, nici rank n-ai, ce faci cu viata ta?💩💩💩💩💩"),
+    (700, "Stick to replays lil bro, you're not ready for the big leagues"),
+    (725, "Vai de curu GENETIC FAILURE"),
+    (750, "👩‍🦽👩‍🦽‍➡️♿👩‍🦽👩‍🦽‍➡️♿👩‍🦽👩‍🦽‍➡️♿"),
+    (775, "BAAAAAAA, CE PULA MEA FACI?"),
+    (800, "Mihai a avut dreptate, RANK 53172685378216538712 🗿🗿🗿🗿🗿"),
+    (850, "You need to make a deal with the DEVIL to get out of this one 🤝🤝🤝🤝🤝 😈🔞"),
+    (900, "Esti un GUNOI!!!! Mihai juca mai bine, apuca te de LOL si joaca Garen ca atata stii sa faci"),
+    (1000, "Get a job lil bro... https://www.linkedin.com/ "),
+    (2000, "ROMPREST!!!! https://romprest.eu/ "),
+]
+DEFAULT_RANK_TIER_TEXT = "Esti un gunoi bun de nimic, da-i uninstall"  # Above the last threshold
+
 # Headers for Discord API requests using the bot token
 HEADERS = {
     "Authorization": f"Bot {DISCORD_BOT_TOKEN}",
     "Content-Type": "application/json"
 }
 
-def send_message_via_webhook(content, webhook_url):
-    # Payload with the message content
-    payload = {
-        "content": content
-    }
-    # POST request to the Discord webhook
-    response = requests.post(webhook_url, json=payload)
-    return response.status_code
-
-def log_data(now, rank, webhook_url):
-    log_message = f"{now.strftime('%d/%m/%Y-%H:%M:%S')} - Rank: {rank}"
-    payload = {
-        "content": log_message
+class TimeoutHTTPAdapter(HTTPAdapter):
+    # requests waits forever by default, one stalled connection would hang the
+    # update (and the daemon's shutdown) with it
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(request, timeout=HTTP_TIMEOUT if timeout is None else timeout, **kwargs)
+
+def create_session():
+    # Keep-alive pool shared by the Dota and Discord calls
+    session = requests.Session()
+    adapter = TimeoutHTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+# Created at import time so warm Lambda invocations reuse the open connections and threads
+SESSION = create_session()
+EXECUTOR = ThreadPoolExecutor(max_workers=8)
+
+def format_log_message(now, rank):
+    return f"{now.strftime('%d/%m/%Y-%H:%M:%S')} - Rank: {rank}"
+
+# Rate limit buckets seen so far, kept across warm invocations:
+# route -> bucket id, and bucket id -> (remaining requests, reset time)
+RATE_LIMIT_ROUTES = {}
+RATE_LIMIT_BUCKETS = {}
+RATE_LIMIT_LOCK = threading.Lock()
+
+class DiscordWriter:
+    # Queues Discord writes and sends them with as few requests as the rate limits
+    # allow. Messages to the same webhook are joined into one message, renames of
+    # the same channel collapse to the latest name. Requests wait for their rate
+    # limit bucket and retry after a 429; waits longer than MAX_WAIT are not slept
+    # through. Deferred renames and unsent messages are kept in the state store and
+    # go out first on the next flush, messages still in their original order.
+    MAX_MESSAGE_LENGTH = 2000
+    MAX_RETRIES = 3
+    MAX_WAIT = 10  # Seconds
+    RENAME_LIMIT = 2  # Channel renames allowed per RENAME_WINDOW
+    RENAME_WINDOW = 600  # Seconds
+
+    def __init__(self, store=None, session=None, executor=None):
+        self.store = store
+        self.session = session or SESSION
+        self.executor = executor or EXECUTOR
+        self.messages = {url: list(contents) for url, contents in (store.get('pending_messages') or {}).items()} if store else {}
+        self.renames = dict(store.get('pending_renames') or {}) if store else {}
+        self.rename_times = dict(store.get('rename_times') or {}) if store else {}
+        self.statuses = {}
+
+    def send_message(self, webhook_url, content):
+        self.messages.setdefault(webhook_url, []).append(content)
+        return ('webhook', webhook_url)
+
+    def rename_channel(self, channel_id, name):
+        self.renames[str(channel_id)] = name
+        return ('channel', str(channel_id))
+
+    def cancel_rename(self, channel_id):
+        # Drops a queued or deferred rename, returns the name it would have set
+        return self.renames.pop(str(channel_id), None)
+
+    @property
+    def pending(self):
+        return bool(self.messages or self.renames)
+
+    def flush(self):
+        # Sends everything queued, returns {key: status code}. Deferred writes have
+        # a None status and stay queued in self.messages / self.renames (and the
+        # state store) for the next flush.
+        jobs = {}
+        for webhook_url, contents in self.messages.items():
+            jobs[('webhook', webhook_url)] = (self._post_messages, webhook_url, contents)
+        for channel_id, name in self.renames.items():
+            jobs[('channel', channel_id)] = (self._rename, channel_id, name)
+        futures = {key: self.executor.submit(*job) for key, job in jobs.items()}
+        results = {key: future.result() for key, future in futures.items()}
+        self.statuses = {key: result[0] if key[0] == 'webhook' else result for key, result in results.items()}
+        self.messages = {webhook_url: results[('webhook', webhook_url)][1] for webhook_url in self.messages
+                         if results[('webhook', webhook_url)][1]}
+        self.renames = {channel_id: name for channel_id, name in self.renames.items()
+                        if self.statuses[('channel', channel_id)] is None}
+        if self.store:
+            self.store.put('pending_messages', self.messages)
+            self.store.put('pending_renames', self.renames)
+            self.store.put('rename_times', self.rename_times)
+        return self.statuses
+
+    def _post_messages(self, webhook_url, contents):
+        # Returns (final status, contents that still have to be sent). Rate limits
+        # and server errors keep the rest for the next flush, other errors would
+        # fail the same way again and drop them.
+        status = None
+        sent = 0
+        for content, count in self._coalesce(contents):
+            status = self._request('POST', webhook_url, webhook_url, json={"content": content})
+            if status is not None and status < 300:
+                sent += count
+                continue
+            if status is not None and status != 429 and status < 500:
+                print(f"Dropping {len(contents) - sent} message(s) the webhook rejected with status {status}")
+                return status, []
+            print(f"Keeping {len(contents) - sent} unsent message(s) for the next run")
+            return status, contents[sent:]
+        return status, []
+
+    def _coalesce(self, contents):
+        # Yields (message, number of contents joined into it)
+        batch = ""
+        count = 0
+        for content in contents:
+            if batch and len(batch) + 1 + len(content) > self.MAX_MESSAGE_LENGTH:
+                yield batch, count
+                batch = ""
+                count = 0
+            batch = f"{batch}\n{content}" if batch else content
+            count += 1
+        if batch:
+            yield batch, count
+
+    def _rename(self, channel_id, name):
+        now = time.time()
+        recent = [at for at in self.rename_times.get(channel_id, []) if now - at < self.RENAME_WINDOW]
+        if len(recent) >= self.RENAME_LIMIT:
+            print(f"Channel {channel_id} was renamed {len(recent)} times in the last 10 minutes, deferring rename to {name}")
+            return None
+        url = f"{DISCORD_API_URL}/channels/{channel_id}"
+        status = self._request('PATCH', url, f"channels/{channel_id}", headers=HEADERS, json={"name": name})
+        if status is not None and status < 300:
+            recent.append(now)
+        self.rename_times[channel_id] = recent
+        return status
+
+    def _request(self, method, url, route, **kwargs):
+        # Returns the final status code, or None when the rate limit wait is too long
+        # or the request failed without a response
+        for _ in range(self.MAX_RETRIES + 1):
+            wait = self._bucket_wait(route)
+            if wait > self.MAX_WAIT:
+                return None
+            if wait > 0:
+                time.sleep(wait)
+
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                # Like a long rate limit wait, the write is kept for the next run
+                print(f"{method} {route} failed ({e.__class__.__name__}), deferring it")
+                return None
+            self._update_bucket(route, response.headers)
+            if response.status_code != 429:
+                return response.status_code
+
+            retry_after = response.headers.get('Retry-After')
+            if retry_after is None:
+                try:
+                    retry_after = response.json().get('retry_after', 1)
+                except ValueError:
+                    retry_after = 1
+            retry_after = float(retry_after)
+            print(f"Rate limited on {route}, retry after {retry_after}s")
+            if retry_after > self.MAX_WAIT:
+                return None
+            time.sleep(retry_after)
+        return 429
+
+    @staticmethod
+    def _bucket_wait(route):
+        with RATE_LIMIT_LOCK:
+            bucket = RATE_LIMIT_BUCKETS.get(RATE_LIMIT_ROUTES.get(route))
+            if bucket is None:
+                return 0
+            remaining, reset_at = bucket
+            wait = reset_at - time.time()
+            if wait <= 0:
+                return 0
+            if remaining > 0:
+                # Reserve a request so concurrent senders do not overrun the bucket
+                RATE_LIMIT_BUCKETS[RATE_LIMIT_ROUTES[route]] = (remaining - 1, reset_at)
+                return 0
+            return wait
+
+    @staticmethod
+    def _update_bucket(route, headers):
+        bucket = headers.get('X-RateLimit-Bucket')
+        if bucket is None or headers.get('X-RateLimit-Remaining') is None:
+            return
+        with RATE_LIMIT_LOCK:
+            RATE_LIMIT_ROUTES[route] = bucket
+            RATE_LIMIT_BUCKETS[bucket] = (
+                int(headers['X-RateLimit-Remaining']),
+                time.time() + float(headers.get('X-RateLimit-Reset-After', 0)),
+            )
+
+def load_tracked_players():
+    # TRACKED_PLAYERS is either a JSON list or a path to a JSON file with the list
+    if not TRACKED_PLAYERS:
+        return [dict(DEFAULT_PLAYER)]
+
+    if TRACKED_PLAYERS.lstrip().startswith('['):
+        config = json.loads(TRACKED_PLAYERS)
+    else:
+        with open(TRACKED_PLAYERS, encoding='utf-8') as file:
+            config = json.load(file)
+
+    players = []
+    for entry in config:
+        missing = [field for field in ("label", "name", "team_id", "team_tag") if field not in entry]
+        if missing:
+            raise ValueError(f"Tracked player {entry} is missing {', '.join(missing)}")
+        player = dict(entry)
+        player['team_id'] = int(player['team_id']) if player['team_id'] is not None else None
+        players.append(player)
+
+    labels = [player['label'] for player in players]
+    if len(set(labels)) != len(labels):
+        raise ValueError("Tracked player labels must be unique")
+
+    # WEBHOOK_URL_LOG is the channel stats_andrei.py reads back as one player's rank
+    # history, only the first player logs there by default. The others log to their
+    # own webhook_url_log, or not at all.
+    for player in players[1:]:
+        player.setdefault('webhook_url_log', None)
+    return players
+
+def load_divisions():
+    if DIVISIONS.strip() == 'all':
+        return list(ALL_DIVISIONS)
+    divisions = [division.strip() for division in DIVISIONS.split(',') if division.strip()]
+    unknown = [division for division in divisions if division not in ALL_DIVISIONS]
+    if unknown or not divisions:
+        raise ValueError(f"Unknown divisions in DIVISIONS: {DIVISIONS!r}")
+    return divisions
+
+class RankResolver:
+    # Resolves every tracked player in one pass over the leaderboards.
+    # Exact matches are keyed on (name, team_id, team_tag); players that renamed
+    # themselves are matched afterwards on team_id alone. Several division streams
+    # can feed the same resolver, a player found on more than one leaderboard keeps
+    # the match from the division listed first: a division's stream only stops early
+    # once no player could still get a better match from it (done_for).
+    def __init__(self, players, divisions=None):
+        self.players = players
+        self.by_key = {(p['name'], p['team_id'], p['team_tag']): p for p in players}
+        self.by_team = {}
+        for player in players:
+            if player['team_id']:
+                self.by_team.setdefault(player['team_id'], []).append(player)
+        self.priority = {division: index for index, division in enumerate(divisions or [])}
+        self.ranks = {}
+        self.divisions = {}
+        self.team_candidates = {}
+        self.lock = threading.RLock()
+
+    @property
+    def done(self):
+        return len(self.ranks) == len(self.players)
+
+    def done_for(self, division):
+        # True when reading more of `division` cannot change any exact match, every
+        # player is matched in it or in a division listed before it
+        if not self.done:
+            return False
+        priority = self.priority.get(division, 0)
+        with self.lock:
+            return all(self.priority.get(found_in, 0) <= priority for found_in in self.divisions.values())
+
+    def offer(self, entry, division=None):
+        player = self.by_key.get((entry.get('name'), entry.get('team_id'), entry.get('team_tag')))
+        with self.lock:
+            if player is not None and self._same_country(player, entry):
+                self._claim(player['label'], int(entry['rank']), division)
+            elif entry.get('team_id') in self.by_team:
+                for player in self.by_team[entry['team_id']]:
+                    if self._same_country(player, entry):
+                        self.team_candidates.setdefault(player['label'], []).append((entry, division))
+            return self.done_for(division)
+
+    def claim(self, label, rank, division=None):
+        with self.lock:
+            self._claim(label, rank, division)
+
+    def _claim(self, label, rank, division):
+        if label in self.ranks and self.priority.get(self.divisions[label], 0) <= self.priority.get(division, 0):
+            return
+        self.ranks[label] = rank
+        self.divisions[label] = division
+
+    def resolve(self):
+        # Fall back to team_id for anyone without an exact match, skipping entries
+        # that were already claimed and ambiguous teams
+        claimed = {(rank, self.divisions[label]) for label, rank in self.ranks.items()}
+        for player in self.players:
+            label = player['label']
+            if label in self.ranks:
+                continue
+            candidates = [(entry, division) for entry, division in self.team_candidates.get(label, [])
+                          if (int(entry['rank']), division) not in claimed]
+            if len(candidates) == 1:
+                entry, division = candidates[0]
+                print(f"Player {label} matched by team_id as \"{entry.get('name')}\"")
+                self._claim(label, int(entry['rank']), division)
+                claimed.add((self.ranks[label], division))
+            elif len(candidates) > 1:
+                print(f"Player {label} not found, {len(candidates)} players share team_id {player['team_id']}")
+            else:
+                print(f"Player {label} not found")
+        return {player['label']: self.ranks.get(player['label']) for player in self.players}
+
+    @staticmethod
+    def _same_country(player, entry):
+        return not player.get('country') or entry.get('country') == player['country']
+
+class LeaderboardStream:
+    # Incremental parser for the GetDivisionLeaderboard body. Leaderboard entries are
+    # decoded one at a time while the body is downloaded, so the caller can stop
+    # reading as soon as it has what it needs. Top-level fields that come before the
+    # leaderboard array (time_posted, server_time, ...) are collected in `header`.
+    WHITESPACE = " \t\r\n"
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.bytes_read = 0
+        self.entries_read = 0
+        self.exhausted = False
+        self.finished = False
+        self.header = {}
+
+    def __iter__(self):
+        self._expect('{')
+        if self._peek() == '}':
+            self.finished = True
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            if key == 'leaderboard':
+                yield from self._entries()
+            else:
+                self.header[key] = self._value()
+            if self._peek() == ',':
+                self.pos += 1
+                continue
+            self._expect('}')
+            self.finished = True
+            return
+
+    def _entries(self):
+        self._expect('[')
+        if self._peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            entry = self._value()
+            self.entries_read += 1
+            yield entry
+            separator = self._peek()
+            self.pos += 1
+            if separator == ']':
+                return
+            if separator != ',':
+                raise ValueError(f"Unexpected {separator!r} in leaderboard array")
+
+    def _fill(self):
+        if self.exhausted:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.exhausted = True
+            text = self.decoder.decode(b'', final=True)
+        else:
+            self.bytes_read += len(chunk)
+            text = self.decoder.decode(chunk)
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in self.WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of leaderboard payload")
+
+    def _expect(self, char):
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} in leaderboard payload, found {found!r}")
+        self.pos += 1
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # The value is cut off at the end of the buffer, read more and retry
+                if self._fill():
+                    continue
+                raise ValueError("Truncated leaderboard payload")
+            # A number at the very end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+def report_stream(division, stream, response, elapsed, body_elapsed):
+    wire_bytes = response.raw.tell() if hasattr(response.raw, 'tell') else stream.bytes_read
+    content_length = response.headers.get('Content-Length')
+    if stream.finished or not content_length:
+        print(f"Leaderboard {division}: read {wire_bytes} bytes ({stream.entries_read} players) in {elapsed:.3f}s")
+        return
+    total_bytes = int(content_length)
+    skipped = max(total_bytes - wire_bytes, 0)
+    # Extrapolate from the body transfer rate, the request round trip is paid either way
+    saved = body_elapsed * skipped / wire_bytes if wire_bytes else 0.0
+    print(f"Leaderboard {division}: read {wire_bytes} of {total_bytes} bytes ({stream.entries_read} players) in {elapsed:.3f}s, "
+          f"stopped early, ~{saved:.3f}s saved")
+
+class FileStateStore:
+    # One JSON file per key
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, value):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._path(key) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(value, file)
+        os.replace(tmp_path, self._path(key))
+
+class DynamoDBStateStore:
+    # For deployments where /tmp does not survive cold starts. The table needs a
+    # string partition key named "key".
+    def __init__(self, table_name):
+        import boto3  # Provided by the Lambda runtime, only needed for this backend
+        self.table = boto3.resource('dynamodb').Table(table_name)
+
+    def get(self, key):
+        item = self.table.get_item(Key={'key': key}).get('Item')
+        return json.loads(item['value']) if item else None
+
+    def put(self, key, value):
+        self.table.put_item(Item={'key': key, 'value': json.dumps(value)})
+
+class MemoryStateStore:
+    # Serves every key from memory after the first read, writing through to `backing`.
+    # For long-running processes, which would otherwise re-read the same state on
+    # every update. Values are kept as JSON so callers get fresh copies, like the
+    # other stores.
+    def __init__(self, backing=None):
+        self.backing = backing
+        self.values = {}
+
+    def get(self, key):
+        if key not in self.values:
+            value = self.backing.get(key) if self.backing else None
+            self.values[key] = json.dumps(value)
+        return json.loads(self.values[key])
+
+    def put(self, key, value):
+        self.values[key] = json.dumps(value)
+        if self.backing:
+            self.backing.put(key, value)
+
+def create_state_store(spec=None):
+    spec = spec or STATE_STORE
+    if spec == 'file':
+        return FileStateStore(STATE_DIR)
+    if spec.startswith('dynamodb:'):
+        return DynamoDBStateStore(spec.split(':', 1)[1])
+    raise ValueError(f"Unknown state store {spec!r}")
+
+def load_snapshot(store):
+    return store.get('leaderboard_snapshot')
+
+def save_snapshot(store, snapshot):
+    store.put('leaderboard_snapshot', snapshot)
+
+def snapshot_covers(snapshot, players):
+    return snapshot is not None and 'divisions' in snapshot \
+        and all(player['label'] in snapshot.get('ranks', {}) for player in players)
+
+def hashed_chunks(chunks, hasher):
+    for chunk in chunks:
+        hasher.update(chunk)
+        yield chunk
+
+def fetch_division(division, resolver, cached=None, keep_entries=False):
+    # Streams one division's leaderboard into `resolver`, stopping as soon as the
+    # resolver has every player. Returns (unchanged, division_snapshot, entries);
+    # unchanged is True when `cached` is still current, detected from a 304, an
+    # unchanged time_posted or an unchanged content hash of the bytes read.
+    headers = {}
+    if cached and cached.get('etag'):
+        headers['If-None-Match'] = cached['etag']
+    if cached and cached.get('last_modified'):
+        headers['If-Modified-Since'] = cached['last_modified']
+
+    url = LEADERBOARD_URL.format(division=division)
+    started = time.perf_counter()
+    response = SESSION.get(url, headers=headers, stream=True)
+    received_at = time.time()
+    if response.status_code == 304:
+        response.close()
+        print(f"Leaderboard {division} not modified")
+        return True, cached, None
+
+    body_started = time.perf_counter()
+    hasher = hashlib.sha256()
+    stream = LeaderboardStream(hashed_chunks(response.iter_content(STREAM_CHUNK_SIZE), hasher))
+    entries = [] if keep_entries else None
+    division_snapshot = {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
     }
-    response = requests.post(webhook_url, json=payload)
-    return response.status_code
-
-def update_channel_name(new_name):
-    # Discord API endpoint to modify the channel
-    url = f"https://discord.com/api/v9/channels/{CHANNEL_ID}"
-    payload = {
-        "name": new_name  # New channel name
+    # Only the parsing is guarded, a malformed payload falls back to the full parse
+    # but a bad entry raises from resolver.offer instead of downloading again
+    parsed = iter(stream)
+    offered = 0
+    fallback = None
+    try:
+        while True:
+            try:
+                entry = next(parsed, None)
+            except ValueError as e:
+                print(f"Streaming parse of {division} failed ({e}), falling back to the full parse")
+                fallback = SESSION.get(url)
+                break
+            if entry is None:
+                break
+            # time_posted comes before the leaderboard array, so a repeat is caught
+            # before any player is decoded
+            if stream.entries_read == 1 and cached and stream.header.get('time_posted') is not None \
+                    and stream.header['time_posted'] == cached.get('time_posted'):
+                print(f"Leaderboard {division} still the one posted at {stream.header['time_posted']}")
+                return True, cached, None
+            offered += 1
+            if keep_entries:
+                entries.append(entry)
+                resolver.offer(entry, division)
+            elif resolver.done_for(division) or resolver.offer(entry, division):
+                break
+        if fallback is None:
+            finished = time.perf_counter()
+            report_stream(division, stream, response, finished - started, finished - body_started)
+    finally:
+        response.close()
+
+    if fallback is not None:
+        payload = fallback.json()
+        hasher = hashlib.sha256(fallback.content)
+        stream.header = {key: value for key, value in payload.items() if key != 'leaderboard'}
+        # The entries streamed before the failure were offered already
+        for entry in payload['leaderboard'][offered:]:
+            resolver.offer(entry, division)
+        if keep_entries:
+            entries = payload['leaderboard']
+
+    division_snapshot['time_posted'] = stream.header.get('time_posted')
+    division_snapshot['next_scheduled_post_time'] = stream.header.get('next_scheduled_post_time')
+    # With the local time the response arrived, server_time maps the schedule onto our clock
+    division_snapshot['server_time'] = stream.header.get('server_time')
+    division_snapshot['received_at'] = received_at
+    division_snapshot['content_hash'] = hasher.hexdigest()
+    if cached and division_snapshot['content_hash'] == cached.get('content_hash'):
+        print(f"Leaderboard {division} content unchanged")
+        return True, cached, None
+    return False, division_snapshot, entries
+
+def fetch_leaderboard(players, snapshot=None, keep_entries=False, divisions=None):
+    # Downloads each division's leaderboard once, all divisions at the same time,
+    # and resolves every tracked player from them in one shared index. With
+    # keep_entries the whole leaderboards are always read and returned.
+    #
+    # Returns (ranks, snapshot, entries) where entries maps division to its full
+    # leaderboard. ranks is None when no division was reposted since `snapshot`;
+    # the division each player was found in is in snapshot['player_divisions'].
+    divisions = divisions or load_divisions()
+    usable = snapshot_covers(snapshot, players)
+    resolver = RankResolver(players, divisions)
+    futures = {
+        division: EXECUTOR.submit(fetch_division, division, resolver,
+                                  snapshot['divisions'].get(division) if usable else None, keep_entries)
+        for division in divisions
     }
-    # PATCH request to update the channel name
-    response = requests.patch(url, headers=HEADERS, json=payload)
-    return response.status_code
+
+    new_snapshot = {'divisions': {}}
+    entries = {}
+    changed = False
+    for division, future in futures.items():
+        unchanged, division_snapshot, division_entries = future.result()
+        if division_snapshot is not None:
+            new_snapshot['divisions'][division] = division_snapshot
+        if unchanged:
+            # Players last seen on this leaderboard are still where they were
+            for label, rank in snapshot['ranks'].items():
+                if rank is not None and snapshot['player_divisions'].get(label) == division:
+                    resolver.claim(label, rank, division)
+        else:
+            changed = True
+            if division_entries is not None:
+                entries[division] = division_entries
+
+    if not changed:
+        return None, snapshot, None
+
+    new_snapshot['ranks'] = resolver.resolve()
+    new_snapshot['player_divisions'] = {label: resolver.divisions.get(label) for label in new_snapshot['ranks']}
+    return new_snapshot['ranks'], new_snapshot, entries
+
+def get_current_ranks(players):
+    return fetch_leaderboard(players)[0]
 
 def get_current_rank():
-    api_url = f"https://www.dota2.com/webapi/ILeaderboard/GetDivisionLeaderboard/v0001?division=europe&leaderboard=0"
-    response = requests.get(api_url)
-    leaderboard = response.json()['leaderboard']
-    # leaderboard is an  array of players, each player has a leaderboard_rank, get the rank of player with name == "legacy " and team_id == 9017851 and team_tag == "Plasma" and country_code == "ro"
-
-    leaderboard_rank = None
-    for player in leaderboard:
-        if player['name'] == "legacy " and player['team_id'] == 9017851 and player['team_tag'] == "Plasma" and player['country'] == "ro":
-            leaderboard_rank = player['rank']
-            break
-    
-    if leaderboard_rank is None:
-        print("Player not found")
-
-    return int(leaderboard_rank)
-
-def get_channel_message_and_name(leaderboard_rank: int, old_channel_name: str):
-    message = f"Rankul lui andrei a fost actualizat"
+    return get_current_ranks([DEFAULT_PLAYER])[DEFAULT_PLAYER['label']]
+
+class LeaderboardArchive:
+    # Append-only archive of full leaderboard snapshots:
+    #   players.jsonl  identity dictionary, the line number is the player id
+    #   index.bin      one fixed-size record per snapshot (time, offset, length, kind)
+    #   data.bin       one zlib-compressed block of columns per snapshot, either a
+    #                  keyframe (player ids, ranks) or a delta against the previous
+    #                  snapshot (changed ids, their new ranks, ids that left)
+    # Every KEYFRAME_EVERY-th snapshot is a keyframe, so reading one point in time
+    # only decompresses the blocks since the keyframe before it.
+    INDEX_RECORD = struct.Struct('<qQIB')
+    BLOCK_HEADER = struct.Struct('<II')
+    KEYFRAME = 0
+    DELTA = 1
+    KEYFRAME_EVERY = 48
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.players_path = os.path.join(directory, 'players.jsonl')
+        self.index_path = os.path.join(directory, 'index.bin')
+        self.data_path = os.path.join(directory, 'data.bin')
+
+        self.players = []
+        self.player_ids = {}
+        if os.path.exists(self.players_path):
+            with open(self.players_path, encoding='utf-8') as file:
+                for line in file:
+                    self._add_identity(tuple(json.loads(line)))
+
+        self.times = array('q')
+        self.offsets = array('Q')
+        self.lengths = array('I')
+        self.kinds = array('B')
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as file:
+                for timestamp, offset, length, kind in self.INDEX_RECORD.iter_unpack(file.read()):
+                    self.times.append(timestamp)
+                    self.offsets.append(offset)
+                    self.lengths.append(length)
+                    self.kinds.append(kind)
+        self._latest = None
+
+    def __len__(self):
+        return len(self.times)
+
+    @staticmethod
+    def identity(entry):
+        return (entry.get('name'), entry.get('team_id'), entry.get('team_tag'), entry.get('country'))
+
+    def _add_identity(self, identity):
+        self.player_ids[identity] = len(self.players)
+        self.players.append(identity)
+        return self.player_ids[identity]
+
+    def append(self, timestamp, leaderboard):
+        # Returns False when a snapshot with the same or a later time is already stored
+        if self.times and timestamp <= self.times[-1]:
+            return False
+
+        new_identities = []
+        state = {}
+        for entry in leaderboard:
+            identity = self.identity(entry)
+            player_id = self.player_ids.get(identity)
+            if player_id is None:
+                player_id = self._add_identity(identity)
+                new_identities.append(identity)
+            state[player_id] = int(entry['rank'])
+
+        if len(self.times) % self.KEYFRAME_EVERY == 0:
+            kind = self.KEYFRAME
+            block = self._encode_keyframe(state)
+        else:
+            kind = self.DELTA
+            block = self._encode_delta(self.latest(), state)
+        block = zlib.compress(block, 9)
+
+        # The dictionary and the data go first, a snapshot only exists once indexed
+        if new_identities:
+            with open(self.players_path, 'a', encoding='utf-8') as file:
+                file.writelines(json.dumps(identity) + "\n" for identity in new_identities)
+        with open(self.data_path, 'ab') as file:
+            offset = file.seek(0, os.SEEK_END)
+            file.write(block)
+        with open(self.index_path, 'ab') as file:
+            file.write(self.INDEX_RECORD.pack(timestamp, offset, len(block), kind))
+
+        self.times.append(timestamp)
+        self.offsets.append(offset)
+        self.lengths.append(len(block))
+        self.kinds.append(kind)
+        self._latest = (len(self.times) - 1, state)
+        return True
+
+    @classmethod
+    def _encode_keyframe(cls, state):
+        ids = array('I', state.keys())
+        ranks = array('H', state.values())
+        return cls.BLOCK_HEADER.pack(len(ids), 0) + ids.tobytes() + ranks.tobytes()
+
+    @classmethod
+    def _encode_delta(cls, previous, state):
+        changed = [player_id for player_id, rank in state.items() if previous.get(player_id) != rank]
+        left = array('I', (player_id for player_id in previous if player_id not in state))
+        ids = array('I', changed)
+        ranks = array('H', (state[player_id] for player_id in changed))
+        return cls.BLOCK_HEADER.pack(len(ids), len(left)) + ids.tobytes() + ranks.tobytes() + left.tobytes()
+
+    def _apply_block(self, file, position, state):
+        file.seek(self.offsets[position])
+        block = zlib.decompress(file.read(self.lengths[position]))
+        changed_count, left_count = self.BLOCK_HEADER.unpack_from(block)
+        start = self.BLOCK_HEADER.size
+        ids = array('I', block[start:start + 4 * changed_count])
+        start += 4 * changed_count
+        ranks = array('H', block[start:start + 2 * changed_count])
+        start += 2 * changed_count
+        left = array('I', block[start:start + 4 * left_count])
+
+        if self.kinds[position] == self.KEYFRAME:
+            state.clear()
+        state.update(zip(ids, ranks))
+        for player_id in left:
+            del state[player_id]
+
+    def _iter_states(self, first, last):
+        # Yields (time, {player_id: rank}) for positions first..last, starting from
+        # the keyframe at or before `first`. The same dict is updated in place.
+        position = first
+        while self.kinds[position] != self.KEYFRAME:
+            position -= 1
+        state = {}
+        with open(self.data_path, 'rb') as file:
+            for position in range(position, last + 1):
+                self._apply_block(file, position, state)
+                if position >= first:
+                    yield self.times[position], state
+
+    def _position_at(self, timestamp):
+        return bisect.bisect_right(self.times, timestamp) - 1
+
+    def latest(self):
+        if not self.times:
+            return {}
+        if self._latest is None or self._latest[0] != len(self.times) - 1:
+            last = len(self.times) - 1
+            for _, state in self._iter_states(last, last):
+                self._latest = (last, dict(state))
+        return self._latest[1]
+
+    def snapshot_at(self, timestamp):
+        # Ranks of the snapshot posted at or before `timestamp`
+        position = self._position_at(timestamp)
+        if position < 0:
+            return {}
+        for _, state in self._iter_states(position, position):
+            return dict(state)
+
+    def top(self, n, timestamp=None):
+        # [(rank, (name, team_id, team_tag, country))] for the best n players
+        state = self.latest() if timestamp is None else self.snapshot_at(timestamp)
+        best = heapq.nsmallest(n, state.items(), key=lambda item: item[1])
+        return [(rank, self.players[player_id]) for player_id, rank in best]
+
+    def find_players(self, name=None, team_id=None, team_tag=None):
+        return [player_id for player_id, (player_name, player_team_id, player_team_tag, _) in enumerate(self.players)
+                if (name is None or player_name == name)
+                and (team_id is None or player_team_id == team_id)
+                and (team_tag is None or player_team_tag == team_tag)]
+
+    def player_history(self, player_ids, start=None, end=None):
+        # [(time, rank)] for the given player ids, None while they are off the leaderboard
+        if isinstance(player_ids, int):
+            player_ids = [player_ids]
+        first = 0 if start is None else max(bisect.bisect_left(self.times, start), 0)
+        last = len(self.times) - 1 if end is None else self._position_at(end)
+        if first > last:
+            return []
+        history = []
+        for timestamp, state in self._iter_states(first, last):
+            ranks = [state[player_id] for player_id in player_ids if player_id in state]
+            history.append((timestamp, min(ranks) if ranks else None))
+        return history
+
+def archive_leaderboard(snapshot, entries, directory=None):
+    directory = directory or ARCHIVE_DIR
+    # One archive per division, only the divisions that were reposted are passed in
+    for division, division_entries in entries.items():
+        archive = LeaderboardArchive(os.path.join(directory, division))
+        timestamp = snapshot['divisions'][division].get('time_posted') or int(time.time())
+        if archive.append(timestamp, division_entries):
+            print(f"Archived {len(division_entries)} {division} players posted at {timestamp} "
+                  f"({archive.lengths[-1]} bytes, {len(archive)} snapshots)")
+
+ENTERED = 'entered'
+LEFT = 'left'
+CLIMBED = 'climbed'
+DROPPED = 'dropped'
+
+class RankEvent(namedtuple('RankEvent', ['kind', 'key', 'old_rank', 'new_rank'])):
+    # One player's change between two leaderboards. key is (name, team_id, team_tag),
+    # old_rank is None for ENTERED and new_rank is None for LEFT.
+    __slots__ = ()
+
+    @property
+    def change(self):
+        # Ranks gained, negative for a drop, None when entering or leaving
+        if self.old_rank is None or self.new_rank is None:
+            return None
+        return self.old_rank - self.new_rank
+
+    def describe(self):
+        name, _, team_tag = self.key
+        name = (name or "").strip()
+        player = f"{team_tag}.{name}" if team_tag else name
+        if self.kind == ENTERED:
+            return f"{player} entered the leaderboard at rank {self.new_rank}"
+        if self.kind == LEFT:
+            return f"{player} left the leaderboard from rank {self.old_rank}"
+        return f"{player} {self.kind} {abs(self.change)} to rank {self.new_rank} (was {self.old_rank})"
+
+def player_key(entry):
+    return (entry.get('name'), entry.get('team_id'), entry.get('team_tag'))
+
+def leaderboard_ranks(entries):
+    # {(name, team_id, team_tag): rank} of a full leaderboard, the best rank wins
+    # when several entries share a key
+    ranks = {}
+    for entry in reversed(entries):
+        ranks[player_key(entry)] = int(entry['rank'])
+    return ranks
+
+def rank_event(key, old_rank, new_rank, min_change=1):
+    # The event for one player, None when it moved less than min_change ranks
+    if old_rank is None:
+        return RankEvent(ENTERED, key, None, new_rank)
+    if new_rank is None:
+        return RankEvent(LEFT, key, old_rank, None)
+    if old_rank == new_rank or abs(old_rank - new_rank) < min_change:
+        return None
+    return RankEvent(CLIMBED if new_rank < old_rank else DROPPED, key, old_rank, new_rank)
+
+def diff_leaderboards(previous, current, min_change=1, watched=None):
+    # Events between two leaderboards from leaderboard_ranks, in one pass over each.
+    # Moves smaller than min_change ranks are left out, entering and leaving the
+    # leaderboard always count. With `watched` (a collection of keys) only those
+    # players are looked up instead of every player on both leaderboards.
+    if watched is not None:
+        events = (rank_event(key, previous.get(key), current.get(key), min_change)
+                  for key in watched if key in previous or key in current)
+        return [event for event in events if event is not None]
+
+    events = []
+    min_change = max(min_change, 1)
+    for key, new_rank in current.items():
+        old_rank = previous.get(key)
+        if old_rank is None:
+            events.append(RankEvent(ENTERED, key, None, new_rank))
+        elif old_rank - new_rank >= min_change:
+            events.append(RankEvent(CLIMBED, key, old_rank, new_rank))
+        elif new_rank - old_rank >= min_change:
+            events.append(RankEvent(DROPPED, key, old_rank, new_rank))
+    for key, old_rank in previous.items():
+        if key not in current:
+            events.append(RankEvent(LEFT, key, old_rank, None))
+    return events
+
+# {division: leaderboard_ranks of the last full leaderboard seen}, kept between warm
+# invocations and for the whole life of the daemon
+LAST_LEADERBOARDS = {}
+
+def previous_leaderboard(division, directory=None):
+    # After a cold start the last archived leaderboard stands in for the one in memory
+    if division in LAST_LEADERBOARDS:
+        return LAST_LEADERBOARDS[division]
+    directory = directory or ARCHIVE_DIR
+    if not directory or not os.path.exists(os.path.join(directory, division, 'index.bin')):
+        return None
+    archive = LeaderboardArchive(os.path.join(directory, division))
+    ranks = {}
+    for player_id, rank in sorted(archive.latest().items(), key=lambda item: -item[1]):
+        ranks[archive.players[player_id][:3]] = rank
+    return ranks
+
+def queue_leaderboard_events(entries, players, writer, min_change=None, watch=None):
+    # Diffs every reposted division against its previous leaderboard and queues
+    # the events on `writer`, biggest moves first. Returns the events.
+    min_change = LEADERBOARD_EVENTS_MIN_CHANGE if min_change is None else min_change
+    watch = watch or LEADERBOARD_EVENTS_WATCH
+    watched = None if watch == 'all' else [(p['name'], p['team_id'], p['team_tag']) for p in players]
+
+    events = []
+    for division, division_entries in entries.items():
+        started = time.perf_counter()
+        current = leaderboard_ranks(division_entries)
+        previous = previous_leaderboard(division)
+        LAST_LEADERBOARDS[division] = current
+        if previous is None:
+            continue
+        division_events = diff_leaderboards(previous, current, min_change, watched)
+        print(f"Leaderboard {division}: {len(division_events)} event(s) from {len(previous)} -> {len(current)} players "
+              f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+        events.extend(division_events)
+
+    events.sort(key=lambda event: -abs(event.change) if event.change is not None else 0)
+    for event in events[:MAX_EVENT_LINES]:
+        writer.send_message(WEBHOOK_URL_EVENTS, event.describe())
+    if len(events) > MAX_EVENT_LINES:
+        writer.send_message(WEBHOOK_URL_EVENTS, f"... and {len(events) - MAX_EVENT_LINES} more leaderboard changes")
+    return events
+
+def parse_channel_rank(channel_name):
+    # Only used when there is no stored rank, e.g. "andrei-rank-123-📈" -> 123
+    match = re.search(r"rank-(\d+)", channel_name or "")
+    return int(match.group(1)) if match else None
+
+def validate_rank_tiers(tiers, default_text):
+    thresholds = []
+    texts = []
+    for tier in tiers:
+        if len(tier) != 2:
+            raise ValueError(f"Rank tier {tier!r} must be a [threshold, text] pair")
+        threshold, text = tier
+        if not isinstance(threshold, int) or isinstance(threshold, bool) or threshold < 1:
+            raise ValueError(f"Rank tier threshold {threshold!r} must be a positive integer")
+        if thresholds and threshold <= thresholds[-1]:
+            raise ValueError(f"Rank tier thresholds must be increasing, {threshold} comes after {thresholds[-1]}")
+        if not isinstance(text, str) or not text:
+            raise ValueError(f"Rank tier {threshold} needs a text")
+        thresholds.append(threshold)
+        texts.append(text)
+    if not isinstance(default_text, str) or not default_text:
+        raise ValueError("The rank tier table needs a default text")
+    return thresholds, texts, default_text
+
+@functools.lru_cache(maxsize=None)
+def load_rank_tiers(path=None):
+    # Built once per process. The file holds {"tiers": [[threshold, text], ...], "default": text}
+    path = path or RANK_TIERS_FILE
+    if not path:
+        return validate_rank_tiers(DEFAULT_RANK_TIERS, DEFAULT_RANK_TIER_TEXT)
+    with open(path, encoding='utf-8') as file:
+        config = json.load(file)
+    return validate_rank_tiers(config.get('tiers', []), config.get('default'))
+
+def get_rank_tier_text(leaderboard_rank: int):
+    thresholds, texts, default_text = load_rank_tiers()
+    index = bisect.bisect_left(thresholds, leaderboard_rank)
+    return texts[index] if index < len(texts) else default_text
+
+def get_channel_message_and_name(leaderboard_rank: int, last_rank: int, label: str = "andrei"):
+    message = f"Rankul lui {label} a fost actualizat"
     new_rank_message = f", acum este pe locul **{leaderboard_rank}**"
     old_rank_message = " de la "
-    last_rank = int(old_channel_name.replace("-📈", "").replace("-📉", "").replace("-🔁", "").split('-')[-1].strip()) if old_channel_name is not None else None
-    channel_name = "andrei-rank-" + str(leaderboard_rank)
+    channel_name = f"{label}-rank-" + str(leaderboard_rank)
 
     if last_rank is not None:
         old_rank_message += "**"+str(last_rank)+"**"
@@ -95,111 +1115,256 @@ def get_channel_message_and_name(leaderboard_rank: int, old_channel_name: str):
 
     message+="\n"
 
-    if leaderboard_rank <= 10:
-        message += "Ai terminat DOTA, bravo!"
-    elif leaderboard_rank <= 50:
-        message += "THE GOD OF DOTA"
-    elif leaderboard_rank <= 75:
-        message += "Tatal tau este mandru de tine!"
-    elif leaderboard_rank <= 100:
-        message += "He is locked in, he takes no prisoners, there is no one to tell the tale..."
-    elif leaderboard_rank <= 125:
-        message += '⚡⚡⚡⚡\"I AM THE ONE WHO KNOCKS\"⚡⚡⚡⚡'
-    elif leaderboard_rank <= 150:
-        message += "HE IS LOCKED THE FUCK IN"
-    elif leaderboard_rank <=175:
-        message += "ARMED AND DANGEROUS! AGAIN!! AGAIN!!! AGAIN!!!! 🔫🔫🔫"
-    elif leaderboard_rank <= 200:
-        message += "HELL UNLEASHED!!!!"
-    elif leaderboard_rank <= 225:
-        message += "Time is a flat circle and you are on top of it🔥🔥🔥"
-    elif leaderboard_rank <= 250:
-        message += "KING VON N-A MURIT 🔫🔫🔫🔫🔫🔫"
-    elif leaderboard_rank <= 275:
-        message += "BAI NENE PUMNU MEU BETON ARMAT ZICI CA-I TORPILA DE TANC"
-    elif leaderboard_rank <= 300:
-        message += "CE LE FACI COPILEEEEEEEEEEEEEEEEEEE"
-    elif leaderboard_rank <= 325:
-        message += "CAN ANYBODY STOP THIS OUTRAGEOUS MAN???!!!!"
-    elif leaderboard_rank <= 350:
-        message += "Hai andreie da in pula mea drumu la brate ce cacat faci?!!!"
-    elif leaderboard_rank <= 375:
-       message += "Coaie adormim aici 🛌" 
-    elif leaderboard_rank <= 400:
-        message += "Pentru asta n ai vrut sa mergi la sala? Pentru asta n ai vrut sa mergem la cabane?"
-    elif leaderboard_rank <= 450:
-        message += "HAAAI COAEEE CA NE AI BAGAT PE TOTI IN SCAUNEEEEEEE"
-    elif leaderboard_rank <= 500:
-        message += "Game of thrones Season 8, Mihai dupa 2020, Andrei dupa liceu"
-    elif leaderboard_rank <= 550:
-        message += "At this point lasa-l pe gabi sa joace in locu tau"
-    elif leaderboard_rank <= 600:
-        message += "Sa-i fie tarana usoara💀💀💀💀"
-    elif leaderboard_rank <= 625:
-        message += "BA ESTI PROST, CE FACI CU VIATA TA?"
-    elif leaderboard_rank <= 650:
-        message += "Nici gagica n-ai, nici rank n-ai, ce faci cu viata ta?💩💩💩💩💩"
-    elif leaderboard_rank <= 700:
-        message += "Stick to replays lil bro, you're not ready for the big leagues"
-    elif leaderboard_rank <= 725:
-        message += "Vai de curu GENETIC FAILURE"
-    elif leaderboard_rank <= 750:
-        message += "👩‍🦽👩‍🦽‍➡️♿👩‍🦽👩‍🦽‍➡️♿👩‍🦽👩‍🦽‍➡️♿"
-    elif leaderboard_rank <= 775:
-        message += "BAAAAAAA, CE PULA MEA FACI?"
-    elif leaderboard_rank <= 800:
-        message += "Mihai a avut dreptate, RANK 53172685378216538712 🗿🗿🗿🗿🗿"
-    elif leaderboard_rank <= 850:
-        message += "You need to make a deal with the DEVIL to get out of this one 🤝🤝🤝🤝🤝 😈🔞"
-    elif leaderboard_rank <= 900:
-        message += "Esti un GUNOI!!!! Mihai juca mai bine, apuca te de LOL si joaca Garen ca atata stii sa faci"
-    elif leaderboard_rank <= 1000:
-        message += "Get a job lil bro... https://www.linkedin.com/ "
-    elif leaderboard_rank <= 2000:
-        message += "ROMPREST!!!! https://romprest.eu/ "
-    else:
-        message += "Esti un gunoi bun de nimic, da-i uninstall"
+    message += get_rank_tier_text(leaderboard_rank)
     return message, channel_name
 
-def lambda_handler(event, context):
-    now = datetime.now()
+def get_last_rank(store, player, channel_id):
+    # Returns the last announced rank, reading the channel name only when the
+    # stored state is missing or too old. A rank whose log line is still queued
+    # counts as announced, its messages are on their way.
+    pending = (store.get('pending_ranks') or {}).get(player['label'])
+    if pending is not None:
+        state = pending['state']
+        return state['rank'], state['channel_name'], True
+    state = store.get(f"rank_{player['label']}")
+    if state is not None and time.time() - state['timestamp'] <= RANK_STATE_MAX_AGE:
+        return state['rank'], state['channel_name'], True
 
-    print("Starting the update...")
+    channel = SESSION.get(f"{DISCORD_API_URL}/channels/{channel_id}", headers=HEADERS).json()
+    if not channel or 'name' not in channel:
+        return None, None, False
+    return parse_channel_rank(channel['name']), channel['name'], True
 
-    if now.hour >= 0 and now.hour <= 8:
-        print("Skipping the update because it's too early or too late")
-        print(f"Current hour: {now.hour}")
-        return
+def update_player(now, player, leaderboard_rank, store, writer):
+    # Queues the player's writes on `writer`, returns what report_player needs
+    # once they have been sent, or None when the channel was not found
+    channel_id = player.get('channel_id', CHANNEL_ID)
+    last_rank, old_channel_name, channel_found = get_last_rank(store, player, channel_id)
 
-    leaderboard_rank = get_current_rank()
+    message, channel_name = get_channel_message_and_name(leaderboard_rank, last_rank, player['label'])
 
-    if leaderboard_rank is None:
-        return
+    if not channel_found:
+        print("Channel not found")
+        return None
 
-    channel = requests.get(f"https://discord.com/api/v9/channels/{CHANNEL_ID}", headers=HEADERS).json()
-    old_channel_name = channel['name']
+    log_webhook_url = player.get('webhook_url_log', WEBHOOK_URL_LOG)
 
-    message, channel_name = get_channel_message_and_name(leaderboard_rank, old_channel_name)
+    if channel_name != old_channel_name:
+        update_key = writer.rename_channel(channel_id, channel_name)
+    else:
+        # Renaming to the current name would only spend the rename limit, and a rename
+        # deferred earlier would now take the channel away from the stored name
+        update_key = None
+        cancelled = writer.cancel_rename(channel_id)
+        if cancelled is not None:
+            print(f"Dropping the deferred rename to {cancelled}, the channel is already {channel_name}")
 
-    if channel:
-        update_status = update_channel_name(channel_name)
-        message_status = send_message_via_webhook(message, WEBHOOK_URL_CHAT)
-        log_status = log_data(now, leaderboard_rank, WEBHOOK_URL_LOG)
+    return {
+        'player': player,
+        'rank': leaderboard_rank,
+        'channel_name': channel_name,
+        'old_channel_name': old_channel_name,
+        'update_key': update_key,
+        'message_key': writer.send_message(player.get('webhook_url_chat', WEBHOOK_URL_CHAT), message),
+        'log_key': writer.send_message(log_webhook_url, format_log_message(now, leaderboard_rank)) if log_webhook_url else None,
+    }
 
-        if update_status == 200:
-            print("Channel name updated successfully.")
-        else:
-            print(f"Failed to update channel name. Status code: {update_status}")
+def report_player(update, store, statuses):
+    update_status = statuses[update['update_key']] if update['update_key'] else 200
+    # Players without a log webhook have nothing to wait for
+    log_status = statuses[update['log_key']] if update['log_key'] else None
+    message_status = statuses[update['message_key']]
 
-        if log_status == 200:
-            print("Message sent successfully via webhook.")
-        else:
-            print(f"Failed to send message via webhook. Status code: {log_status}")
+    # The rank only becomes the stored one once its log line is sent, until then it
+    # waits in pending_ranks for settle_pending_ranks
+    label = update['player']['label']
+    state = {
+        'rank': update['rank'],
+        'timestamp': time.time(),
+        'channel_name': update['channel_name'] if update_status == 200 else update['old_channel_name'],
+    }
+    pending_ranks = store.get('pending_ranks') or {}
+    if not update['log_key'] or (log_status is not None and log_status < 300):
+        store.put(f"rank_{label}", state)
+        if pending_ranks.pop(label, None) is not None:
+            store.put('pending_ranks', pending_ranks)
+    else:
+        pending_ranks[label] = {'webhook': update['log_key'][1], 'state': state}
+        store.put('pending_ranks', pending_ranks)
 
-        if message_status == 200:
-            print("Message sent successfully via webhook.")
-        else:
-            print(f"Failed to send message via webhook. Status code: {message_status}")
+    if update_status == 200:
+        print("Channel name updated successfully.")
+    elif update_status is None:
+        print("Channel name update deferred until the rate limit resets.")
+    else:
+        print(f"Failed to update channel name. Status code: {update_status}")
 
+    if not update['log_key']:
+        print(f"No log webhook for {label}, rank not logged.")
+    elif log_status == 200:
+        print("Message sent successfully via webhook.")
+    elif log_status is None:
+        print(f"Log message deferred to the next run, rank {update['rank']} stays pending.")
     else:
-        print("Channel not found")
+        print(f"Failed to send message via webhook. Status code: {log_status}")
+
+    if message_status == 200:
+        print("Message sent successfully via webhook.")
+    elif message_status is None:
+        print("Message deferred to the next run.")
+    else:
+        print(f"Failed to send message via webhook. Status code: {message_status}")
+
+def parse_quiet_hours(spec):
+    # "start-end" to (start, end), None when there are no quiet hours
+    if not spec or not spec.strip():
+        return None
+    match = re.fullmatch(r"\s*(\d{1,2})\s*-\s*(\d{1,2})\s*", spec)
+    if not match or not all(0 <= int(hour) <= 23 for hour in match.groups()):
+        raise ValueError(f"QUIET_HOURS must look like '0-8', got {spec!r}")
+    return int(match.group(1)), int(match.group(2))
+
+def in_quiet_hours(now, spec=None):
+    quiet_hours = parse_quiet_hours(QUIET_HOURS if spec is None else spec)
+    if quiet_hours is None:
+        return False
+    start, end = quiet_hours
+    if start <= end:
+        return start <= now.hour <= end
+    return now.hour >= start or now.hour <= end
+
+def expected_repost(snapshot):
+    # Local epoch time of the earliest next scheduled post across the divisions in
+    # `snapshot`, None when the payloads had no schedule
+    expected = []
+    for division_snapshot in (snapshot or {}).get('divisions', {}).values():
+        next_post = division_snapshot.get('next_scheduled_post_time')
+        if next_post is None:
+            continue
+        server_time = division_snapshot.get('server_time')
+        received_at = division_snapshot.get('received_at')
+        clock_offset = server_time - received_at if server_time is not None and received_at is not None else 0
+        expected.append(next_post - clock_offset)
+    return min(expected, default=None)
+
+def plan_next_poll(snapshot, now_ts, misses=0):
+    # (next poll epoch time, misses) from the schedule in `snapshot`: just after the
+    # expected repost, or, once that has passed without a repost, a jittered
+    # exponential backoff so late reposts are caught without polling in lockstep.
+    # misses counts the polls since the expected repost that found nothing new.
+    expected = expected_repost(snapshot)
+    if expected is None:
+        return None, 0
+    due = expected + POLL_AFTER_REPOST
+    if due > now_ts:
+        return min(due, now_ts + POLL_MAX_INTERVAL), 0
+    misses += 1
+    backoff = min(POLL_BACKOFF_BASE * 2 ** (misses - 1), POLL_MAX_INTERVAL)
+    return now_ts + random.uniform(backoff / 2, backoff), misses
+
+def schedule_next_poll(store, snapshot, poll_plan=None):
+    if not ADAPTIVE_POLLING:
+        return None
+    next_poll, misses = plan_next_poll(snapshot, time.time(), (poll_plan or {}).get('misses', 0))
+    store.put('poll_plan', {'next_poll': next_poll, 'misses': misses})
+    if next_poll is not None:
+        late = f" (repost late, miss {misses})" if misses else ""
+        print(f"Next leaderboard poll in {next_poll - time.time():.0f}s{late}")
+    return next_poll
+
+def settle_pending_ranks(store, writer):
+    # Stores the pending ranks whose log webhook has nothing left to send
+    pending_ranks = store.get('pending_ranks') or {}
+    settled = [label for label, pending in pending_ranks.items() if pending['webhook'] not in writer.messages]
+    for label in settled:
+        store.put(f"rank_{label}", pending_ranks.pop(label)['state'])
+    if settled:
+        store.put('pending_ranks', pending_ranks)
+
+def record_channel_name(store, label, channel_name):
+    # A deferred rename went out, the player's rank state has to name the channel
+    # as it is now, the pending one if the rank is still pending
+    pending_ranks = store.get('pending_ranks') or {}
+    if label in pending_ranks:
+        pending_ranks[label]['state']['channel_name'] = channel_name
+        store.put('pending_ranks', pending_ranks)
+        return
+    state = store.get(f"rank_{label}")
+    if state is not None:
+        state['channel_name'] = channel_name
+        store.put(f"rank_{label}", state)
+
+def retry_deferred_writes(store, players):
+    writer = DiscordWriter(store)
+    if writer.pending:
+        print(f"Retrying {len(writer.renames)} deferred channel rename(s) and "
+              f"{sum(len(contents) for contents in writer.messages.values())} message(s)")
+        renames = dict(writer.renames)
+        statuses = writer.flush()
+        for player in players:
+            channel_id = str(player.get('channel_id', CHANNEL_ID))
+            if statuses.get(('channel', channel_id)) == 200:
+                record_channel_name(store, player['label'], renames[channel_id])
+        settle_pending_ranks(store, writer)
+
+def run_update(now, players, store):
+    # One update of every tracked player, shared by lambda_handler and the daemon.
+    # Returns the epoch time the leaderboard should be polled next, None when
+    # there is no plan (ADAPTIVE_POLLING off or no schedule in the payload).
+    snapshot = load_snapshot(store)
+    poll_plan = store.get('poll_plan') if ADAPTIVE_POLLING else None
+    if poll_plan and poll_plan.get('next_poll') and time.time() < poll_plan['next_poll'] \
+            and snapshot_covers(snapshot, players):
+        print(f"Skipping the update, the next repost is polled in {poll_plan['next_poll'] - time.time():.0f}s")
+        retry_deferred_writes(store, players)
+        return poll_plan['next_poll']
+
+    diff_events = LEADERBOARD_EVENTS_MIN_CHANGE is not None and WEBHOOK_URL_EVENTS is not None
+    ranks, snapshot, entries = fetch_leaderboard(players, snapshot, keep_entries=bool(ARCHIVE_DIR) or diff_events)
+
+    if ranks is None:
+        print("Skipping the update because the leaderboard has not been reposted")
+        retry_deferred_writes(store, players)
+        return schedule_next_poll(store, snapshot, poll_plan)
+
+    writer = DiscordWriter(store)
+    # Before archiving, the archive may hold the previous leaderboard
+    if diff_events:
+        queue_leaderboard_events(entries, players, writer)
+
+    if ARCHIVE_DIR:
+        archive_leaderboard(snapshot, entries)
+
+    updates = []
+    for player in players:
+        leaderboard_rank = ranks[player['label']]
+
+        if leaderboard_rank is None:
+            continue
+
+        print(f"{player['label']} is rank {leaderboard_rank} in {snapshot['player_divisions'][player['label']]}")
+
+        update = update_player(now, player, leaderboard_rank, store, writer)
+        if update is not None:
+            updates.append(update)
+
+    # All players' writes go out together, log lines to the same webhook become one message
+    statuses = writer.flush()
+    for update in updates:
+        report_player(update, store, statuses)
+    settle_pending_ranks(store, writer)
+
+    save_snapshot(store, snapshot)
+    return schedule_next_poll(store, snapshot)
+
+def lambda_handler(event, context):
+    now = datetime.now()
+
+    print("Starting the update...")
+
+    if in_quiet_hours(now):
+        print("Skipping the update because it's too early or too late")
+        print(f"Current hour: {now.hour}")
+        return
+
+    run_update(now, load_tracked_players(), create_state_store())
@@ -0,0 +1,130 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from fake_api_server import FakeApi, start_server
+
+# Runs lambda_handler against the local stand-in (fake_api_server.py) and reports
+# handler latency, requests per invocation and peak Python memory per scenario.
+#
+#   python bench_lambda.py --runs 20 --latency 0.03
+
+DEFAULT_PLAYER = {"name": "legacy ", "team_id": 9017851, "team_tag": "Plasma", "country": "ro"}
+
+SCENARIOS = {
+    # name: (FakeApi options, lambda settings, repost before every run)
+    "no_repost": ({}, {}, False),
+    "repost": ({}, {}, True),
+    "repost_deep_player": ({"players": 20000, "tracked": {"europe": [(19000, DEFAULT_PLAYER)]}}, {}, True),
+    "rate_limited": ({"rate_limit_every": 3}, {}, True),
+    "all_divisions": ({"tracked": {"china": [(40, DEFAULT_PLAYER)]}}, {"DIVISIONS": "all"}, True),
+    "archive": ({}, {"ARCHIVE_DIR": True}, True),
+    "leaderboard_events": ({"churn": 0.05}, {"LEADERBOARD_EVENTS_MIN_CHANGE": 1, "LEADERBOARD_EVENTS_WATCH": "all"}, True),
+}
+
+
+class NoonDatetime(datetime):
+    # Keeps the handler out of its quiet hours whatever time the benchmark runs at
+    @classmethod
+    def now(cls, tz=None):
+        return datetime.now(tz).replace(hour=12)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def run_scenario(lambda_function, name, latency, runs):
+    api_options, settings, repost = SCENARIOS[name]
+    api_options = dict(api_options)
+    api_options.setdefault("tracked", {"europe": [(10, DEFAULT_PLAYER)]})
+    api = FakeApi(latency=latency, **api_options)
+    server = start_server(api)
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        lambda_function.LEADERBOARD_URL = f"{server.base_url}/leaderboard?division={{division}}"
+        lambda_function.DISCORD_API_URL = f"{server.base_url}/api"
+        lambda_function.WEBHOOK_URL_CHAT = f"{server.base_url}/webhooks/chat"
+        lambda_function.WEBHOOK_URL_LOG = f"{server.base_url}/webhooks/log"
+        lambda_function.STATE_DIR = state_dir
+        lambda_function.DIVISIONS = settings.get("DIVISIONS", "europe")
+        lambda_function.ARCHIVE_DIR = os.path.join(state_dir, "archive") if settings.get("ARCHIVE_DIR") else None
+        lambda_function.LEADERBOARD_EVENTS_MIN_CHANGE = settings.get("LEADERBOARD_EVENTS_MIN_CHANGE")
+        lambda_function.LEADERBOARD_EVENTS_WATCH = settings.get("LEADERBOARD_EVENTS_WATCH", "tracked")
+        lambda_function.WEBHOOK_URL_EVENTS = f"{server.base_url}/webhooks/events"
+        lambda_function.LAST_LEADERBOARDS.clear()
+        # Every run has to fetch, whatever the stand-in's posting schedule says
+        lambda_function.ADAPTIVE_POLLING = False
+        lambda_function.RATE_LIMIT_ROUTES.clear()
+        lambda_function.RATE_LIMIT_BUCKETS.clear()
+
+        # The first run fills the snapshot and rank state, like any warm container
+        with contextlib.redirect_stdout(io.StringIO()):
+            lambda_function.lambda_handler(None, None)
+        api.reset_counts()
+
+        latencies = []
+        for _ in range(runs):
+            if repost:
+                api.repost()
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                lambda_function.lambda_handler(None, None)
+            latencies.append(time.perf_counter() - started)
+        request_counts = dict(api.requests)
+
+        # Tracing slows the handler down, so memory gets its own run
+        if repost:
+            api.repost()
+        tracemalloc.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            lambda_function.lambda_handler(None, None)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    server.shutdown()
+    return {
+        "scenario": name,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "requests_per_run": {route: count / runs for route, count in sorted(request_counts.items())},
+        "peak_memory_kb": peak_memory / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark lambda_handler against the local API stand-in")
+    parser.add_argument('--runs', type=int, default=20, help="Invocations per scenario")
+    parser.add_argument('--latency', type=float, default=0.02, help="Seconds added to every stand-in response")
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help="Scenarios to run, all by default")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    args = parser.parse_args()
+
+    os.environ.setdefault('DISCORD_BOT_TOKEN', 'benchmark')
+    os.environ.setdefault('CHANNEL_ID', '1')
+    import PROD_lambda_function as lambda_function
+    lambda_function.datetime = NoonDatetime
+
+    results = [run_scenario(lambda_function, name, args.latency, args.runs) for name in args.scenario or SCENARIOS]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'scenario':<20} {'p50 ms':>9} {'p99 ms':>9} {'peak KB':>9}  requests per run")
+    for result in results:
+        requests_per_run = ", ".join(f"{route}: {count:g}" for route, count in result["requests_per_run"].items())
+        print(f"{result['scenario']:<20} {result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f} "
+              f"{result['peak_memory_kb']:>9.0f}  {requests_per_run}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-in for GetDivisionLeaderboard and the Discord endpoints the lambda uses,
+# so lambda_handler can be exercised and timed without touching the real APIs.
+#
+#   GET   /leaderboard?division=<division>   GetDivisionLeaderboard
+#   GET   /api/channels/<id>                  channel lookup
+#   PATCH /api/channels/<id>                  channel rename
+#   POST  /webhooks/<name>                    webhook message
+
+DIVISIONS = ["europe", "americas", "se_asia", "china"]
+
+
+class FakeApi:
+    def __init__(self, players=5000, latency=0.0, rate_limit_every=0, retry_after=0.05, etag=True,
+                 tracked=None, churn=0.0):
+        self.players = players  # Leaderboard size, sets the payload size
+        self.latency = latency  # Seconds added to every response
+        self.rate_limit_every = rate_limit_every  # Every n-th Discord write gets a 429, 0 to disable
+        self.retry_after = retry_after
+        self.etag = etag
+        # {division: [(rank, entry), ...]} placed on top of the generated players
+        self.tracked = tracked or {}
+        self.churn = churn  # Share of the players that move on every repost, a tenth of them replaced by new players
+        self.order = list(range(1, players + 1))  # Generated player number at each rank
+        self.next_player = players + 1
+        self.random = random.Random(0)
+        self.time_posted = 1700000000
+        self.channel_names = {}
+        self.requests = Counter()
+        self.discord_writes = 0
+        self.lock = threading.Lock()
+        self._bodies = {}
+
+    def repost(self):
+        # Bodies are built here rather than per request, so serving them costs
+        # the benchmark as little as possible
+        with self.lock:
+            self.time_posted += 3600
+            self._move_players()
+            self._bodies = {division: self._build_body(division) for division in DIVISIONS}
+
+    def _move_players(self):
+        moves = int(len(self.order) * self.churn)
+        for _ in range(moves):
+            rank = self.random.randrange(len(self.order))
+            other = min(max(rank + self.random.randint(-50, 50), 0), len(self.order) - 1)
+            self.order[rank], self.order[other] = self.order[other], self.order[rank]
+        for _ in range(moves // 10):
+            self.order[self.random.randrange(len(self.order))] = self.next_player
+            self.next_player += 1
+
+    def reset_counts(self):
+        with self.lock:
+            self.requests.clear()
+
+    def _build_body(self, division):
+        leaderboard = [
+            {"rank": rank, "name": f"{division}_player_{player}", "team_id": player * 7,
+             "team_tag": "TAG", "country": "ro", "sponsor": ""}
+            for rank, player in enumerate(self.order, 1)
+        ]
+        for rank, entry in self.tracked.get(division, []):
+            leaderboard[rank - 1] = dict(entry, rank=rank)
+        body = json.dumps({
+            "time_posted": self.time_posted,
+            "next_scheduled_post_time": self.time_posted + 3600,
+            "server_time": self.time_posted + 60,
+            "leaderboard": leaderboard,
+        }).encode()
+        return body, '"%s"' % hashlib.md5(body).hexdigest()
+
+    def leaderboard_body(self, division):
+        with self.lock:
+            if division not in self._bodies:
+                self._bodies[division] = self._build_body(division)
+            return self._bodies[division]
+
+    def take_rate_limit(self):
+        with self.lock:
+            self.discord_writes += 1
+            return self.rate_limit_every and self.discord_writes % self.rate_limit_every == 0
+
+    def count(self, route):
+        with self.lock:
+            self.requests[route] += 1
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    api = None  # Set by start_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The lambda stops reading once it has its players
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _rate_limited(self):
+        if not self.api.take_rate_limit():
+            return False
+        body = json.dumps({"message": "You are being rate limited.", "retry_after": self.api.retry_after}).encode()
+        self._send(429, body, {'Retry-After': str(self.api.retry_after), 'X-RateLimit-Bucket': 'fake',
+                               'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset-After': str(self.api.retry_after)})
+        return True
+
+    def do_GET(self):
+        time.sleep(self.api.latency)
+        url = urlparse(self.path)
+        if url.path == '/leaderboard':
+            division = parse_qs(url.query).get('division', ['europe'])[0]
+            self.api.count(f"GET leaderboard {division}")
+            body, etag = self.api.leaderboard_body(division)
+            if self.api.etag and self.headers.get('If-None-Match') == etag:
+                return self._send(304)
+            return self._send(200, body, {'ETag': etag} if self.api.etag else {})
+        if url.path.startswith('/api/channels/'):
+            self.api.count("GET channel")
+            channel_id = url.path.rsplit('/', 1)[-1]
+            name = self.api.channel_names.get(channel_id, "andrei-rank-500")
+            return self._send(200, json.dumps({"id": channel_id, "name": name}).encode())
+        self._send(404)
+
+    def do_PATCH(self):
+        time.sleep(self.api.latency)
+        url = urlparse(self.path)
+        if not url.path.startswith('/api/channels/'):
+            return self._send(404)
+        self.api.count("PATCH channel")
+        payload = self._read_json()
+        if self._rate_limited():
+            return
+        self.api.channel_names[url.path.rsplit('/', 1)[-1]] = payload.get('name')
+        self._send(200, b'{}', {'X-RateLimit-Bucket': 'channel', 'X-RateLimit-Remaining': '1',
+                                'X-RateLimit-Reset-After': '0.01'})
+
+    def do_POST(self):
+        time.sleep(self.api.latency)
+        url = urlparse(self.path)
+        if not url.path.startswith('/webhooks/'):
+            return self._send(404)
+        self.api.count("POST webhook")
+        self._read_json()
+        if self._rate_limited():
+            return
+        self._send(200, b'{}', {'X-RateLimit-Bucket': 'webhook', 'X-RateLimit-Remaining': '4',
+                                'X-RateLimit-Reset-After': '0.01'})
+
+
+class FakeApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # Clients closing early (the streamed leaderboard) are expected
+
+
+def start_server(api, port=0):
+    # Serves `api` on a background thread, returns the server (base URL in server.base_url)
+    handler = type('BoundFakeApiHandler', (FakeApiHandler,), {'api': api})
+    server = FakeApiServer(('127.0.0.1', port), handler)
+    server.base_url = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Dota leaderboard and Discord APIs")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--players', type=int, default=5000, help="Players per leaderboard")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument('--rate-limit-every', type=int, default=0, help="Answer every n-th Discord write with a 429")
+    args = parser.parse_args()
+
+    api = FakeApi(players=args.players, latency=args.latency, rate_limit_every=args.rate_limit_every,
+                  tracked={"europe": [(10, {"name": "legacy ", "team_id": 9017851, "team_tag": "Plasma", "country": "ro"})]})
+    server = start_server(api, args.port)
+    print(f"Serving on {server.base_url}")
+    print(f"  LEADERBOARD_URL={server.base_url}/leaderboard?division={{division}}")
+    print(f"  DISCORD_API_URL={server.base_url}/api")
+    print(f"  WEBHOOK_URL_CHAT={server.base_url}/webhooks/chat")
+    print(f"  WEBHOOK_URL_LOG={server.base_url}/webhooks/log")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
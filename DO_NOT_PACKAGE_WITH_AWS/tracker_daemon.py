@@ -0,0 +1,124 @@
+import argparse
+import asyncio
+import os
+import signal
+import time
+from datetime import datetime
+
+# Runs the lambda's update (PROD_lambda_function.run_update) on a schedule from one
+# long-lived process, for hosting the tracker outside AWS. Compared to a lambda
+# invocation per minute, the HTTP session stays warm, the rank state of every
+# tracked player stays in memory between updates (written through to STATE_STORE)
+# and the environment is read once. With ADAPTIVE_POLLING the daemon sleeps until
+# the poll planned from the leaderboard's posting schedule, --interval is only
+# used when there is no plan (quiet hours, no schedule in the payload).
+#
+#   python tracker_daemon.py --interval 30
+#
+# SIGINT / SIGTERM let the update in progress finish, then exit. HTTP_TIMEOUT bounds
+# every request, so that is never longer than a few timeouts.
+
+DEFAULT_INTERVAL = float(os.environ.get('DAEMON_INTERVAL', 60))  # Seconds between the starts of two unplanned updates
+
+
+class TrackerDaemon:
+    def __init__(self, tracker, interval=DEFAULT_INTERVAL, store=None, players=None):
+        self.tracker = tracker
+        self.interval = interval
+        self.store = store or tracker.MemoryStateStore(tracker.create_state_store())
+        self.players = players or tracker.load_tracked_players()
+        self.stopping = asyncio.Event()
+        self.updates = 0
+
+    def stop(self):
+        if not self.stopping.is_set():
+            print("Stopping after the current update...")
+        self.stopping.set()
+
+    def install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, self.stop)
+            except (NotImplementedError, RuntimeError):
+                signal.signal(signum, lambda *_: loop.call_soon_threadsafe(self.stop))
+
+    def update(self):
+        # (updated, epoch time of the next planned poll or None)
+        now = datetime.now()
+        if self.tracker.in_quiet_hours(now):
+            return False, None
+        return True, self.tracker.run_update(now, self.players, self.store)
+
+    async def run_once(self):
+        # The update blocks on HTTP, so it runs on a thread and the loop stays free
+        # to notice signals. Returns the next planned poll, if any.
+        started = time.perf_counter()
+        try:
+            updated, next_poll = await asyncio.to_thread(self.update)
+        except Exception as e:
+            # A failed update (network, Discord) must not take the daemon down, the
+            # next one retries from the same state
+            print(f"Update failed: {e!r}")
+            return None
+        if updated:
+            self.updates += 1
+            print(f"Update {self.updates} took {(time.perf_counter() - started) * 1000:.0f} ms")
+        return next_poll
+
+    async def sleep(self, seconds):
+        # Wakes up early when stopping
+        try:
+            await asyncio.wait_for(self.stopping.wait(), timeout=max(seconds, 0))
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self, max_updates=None):
+        self.install_signal_handlers()
+        labels = ", ".join(player['label'] for player in self.players)
+        print(f"Tracking {len(self.players)} player(s) ({labels}) every {self.interval:g}s")
+
+        # Unplanned updates are scheduled on a fixed grid, so a slow update shortens
+        # the next wait instead of pushing every later update back
+        next_start = time.monotonic()
+        while not self.stopping.is_set():
+            next_poll = await self.run_once()
+            if max_updates is not None and self.updates >= max_updates:
+                break
+            now = time.monotonic()
+            if next_poll is not None:
+                next_start = now + max(next_poll - time.time(), 0)
+            else:
+                next_start += self.interval
+                if next_start < now:
+                    # Missed slots are skipped rather than run back to back
+                    next_start = now + self.interval
+            await self.sleep(next_start - now)
+
+        self.close()
+
+    def close(self):
+        self.tracker.EXECUTOR.shutdown(wait=True)
+        self.tracker.SESSION.close()
+        print("Stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the rank tracker as a long-lived process")
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL, help="Seconds between the starts of two updates")
+    parser.add_argument('--max-updates', type=int, help="Exit after this many updates (outside quiet hours)")
+    args = parser.parse_args()
+
+    # The lambda module reads its settings at import, so .env has to be loaded first
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+    import PROD_lambda_function as tracker
+
+    asyncio.run(TrackerDaemon(tracker, args.interval).run(args.max_updates))
+
+
+if __name__ == "__main__":
+    main()
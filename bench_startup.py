@@ -0,0 +1,64 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Cold-start cost of every stats_andrei.py subcommand: a fresh interpreter imports the
+# module and the dependencies of one subcommand (stats_andrei.load_dependencies), which
+# is everything it loads before doing any work.
+#
+#   python bench_startup.py --runs 10
+
+COMMANDS = ['sync', 'backup', 'plot', 'video', 'send']
+
+PROBE = """
+import time
+started = time.perf_counter()
+import stats_andrei
+imported = time.perf_counter()
+if {command!r}:
+    stats_andrei.load_dependencies({command!r})
+print(imported - started, time.perf_counter() - started)
+"""
+
+
+def measure(command, runs):
+    # (module import seconds, total seconds) of each run
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(command=command)], cwd=here,
+                                capture_output=True, text=True, check=True).stdout
+        results.append(tuple(float(value) for value in output.split()))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark stats_andrei.py startup per subcommand")
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters per subcommand")
+    parser.add_argument('--command', action='append', choices=COMMANDS, help="Subcommands to measure, all by default")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for command in [''] + (args.command or COMMANDS):
+        runs = measure(command, args.runs)
+        results.append({
+            "command": command or "(import only)",
+            "import_ms": statistics.median(imported for imported, _ in runs) * 1000,
+            "startup_ms": statistics.median(total for _, total in runs) * 1000,
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'command':<16} {'import ms':>10} {'startup ms':>11}")
+    for result in results:
+        print(f"{result['command']:<16} {result['import_ms']:>10.1f} {result['startup_ms']:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
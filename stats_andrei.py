@@ -1,47 +1,335 @@
-import discord
+import asyncio
+import hashlib
+import importlib
+import json
+import multiprocessing
 import re
-from datetime import datetime
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
-from dotenv import load_dotenv
+import sqlite3
+import subprocess
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+import numpy as np
 import os
 import argparse
-from tqdm import tqdm
 
-# Load environment variables from .env file
-load_dotenv()
-TOKEN = os.getenv('DISCORD_BOT_TOKEN')
-CHANNEL_ID = int(os.getenv('DISCORD_CHANNEL_ID'))
-CHANNEL_ID_BACKUP = int(os.getenv('DISCORD_CHANNEL_ID_BACKUP'))
-CHANNEL_ID_PLOTS = int(os.getenv('DISCORD_CHANNEL_ID_PLOT'))
+# discord, pandas, matplotlib, tqdm and dotenv are imported by the functions that use
+# them, so each subcommand only pays for what it runs. Environment variables (.env is
+# loaded by main) are read when they are used, importing the module has no side effects.
+COMMAND_DEPENDENCIES = {
+    'sync': ('discord', 'tqdm'),
+    'backup': ('discord',),
+    'plot': ('matplotlib.pyplot',),
+    'video': ('matplotlib.backends.backend_agg', 'matplotlib.dates', 'matplotlib.figure', 'tqdm'),
+    'send': ('discord', 'matplotlib.pyplot', 'tqdm'),
+}
+DEFAULT_RANK_STORE_PATH = 'backup/ranks.sqlite3'  # RANK_STORE_PATH overrides it
+BACKFILL_WINDOWS_PER_TASK = 4  # More windows than tasks keeps every task busy until the end
+ANIMATION_FPS = 30  # Frame budget per second of video, longer histories are decimated to fit
+ANIMATION_CHUNK_FRAMES = 8  # Frames a worker renders per task
+DEFAULT_RENDER_CACHE_MAX_MB = 1024  # Per images/ and videos/, RENDER_CACHE_MAX_MB overrides it
+DEFAULT_RENDER_CACHE_MAX_AGE_DAYS = 30  # Unused renders older than this are removed, RENDER_CACHE_MAX_AGE_DAYS overrides it
+RENDER_VERSION = 1  # Bump when a change to the plotting code should invalidate cached renders
+ROLLUP_INTERVALS = ('D', 'W', 'M')  # Days, weeks starting on Monday, months
+ROLLUP_VERSION = 1  # Bump when the rollup columns change, stores rebuild them on open
 
-intents = discord.Intents.default()
-intents.messages = True
+EPOCH = datetime(1970, 1, 1)
 
-client = discord.Client(intents=intents)
+def to_timestamp(date_time):
+    return int((date_time - EPOCH).total_seconds())
 
-async def fetch_messages(channel, start_date, end_date, fresh=False):
-    messages = []
-    last_message_id = None
-    last_csv_date = None
-    
-    if not fresh:
-        latest_csv_path = get_latest_csv_file()
-        if latest_csv_path:
-            print(f"Reading from latest CSV file: {latest_csv_path}")
-            try:
-                last_csv_date, _ = get_last_from_csv(latest_csv_path)
-                print(f"Last entry in CSV is at {last_csv_date}")
-                csv_data = read_from_csv(latest_csv_path)
-                for _, row in csv_data.iterrows():
-                    if (not start_date or row['DateTime'] >= start_date.utcnow()) and (not end_date or row['DateTime'] <= end_date.utcnow()):
-                        messages.append({
-                            'DateTime': row['DateTime'],
-                            'Rank': row['Rank']
-                        })
-            except Exception as e:
-                print(f"Error reading CSV file: {e}")
+def from_timestamp(timestamp):
+    return EPOCH + timedelta(seconds=timestamp)
+
+class RankSeries:
+    # Rank history as two contiguous arrays: int64 epoch seconds and uint16 ranks,
+    # 10 bytes per sample. Filled in chunks (the buffers grow geometrically), slices
+    # and the datetime view share memory with the buffers.
+    def __init__(self, timestamps=None, ranks=None):
+        self._timestamps = np.asarray(timestamps if timestamps is not None else [], dtype=np.int64)
+        self._ranks = np.asarray(ranks if ranks is not None else [], dtype=np.uint16)
+        self._size = len(self._timestamps)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def empty(self):
+        return self._size == 0
+
+    @property
+    def timestamps(self):
+        return self._timestamps[:self._size]
+
+    @property
+    def ranks(self):
+        return self._ranks[:self._size]
+
+    @property
+    def datetimes(self):
+        # Same memory as timestamps, typed for matplotlib
+        return self.timestamps.view('datetime64[s]')
+
+    def extend(self, timestamps, ranks):
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        ranks = np.asarray(ranks)
+        if ranks.size and (ranks.min() < 0 or ranks.max() > np.iinfo(np.uint16).max):
+            raise ValueError("Rank out of range for the rank series")
+        size = self._size + len(timestamps)
+        if size > len(self._timestamps):
+            capacity = max(size, 2 * len(self._timestamps), 1024)
+            self._timestamps = np.resize(self._timestamps[:self._size], capacity)
+            self._ranks = np.resize(self._ranks[:self._size], capacity)
+        self._timestamps[self._size:size] = timestamps
+        self._ranks[self._size:size] = ranks
+        self._size = size
+
+    def between(self, start_date=None, end_date=None):
+        # Samples between start_date and end_date, both inclusive, as a view
+        start = np.searchsorted(self.timestamps, to_timestamp(start_date), 'left') if start_date else 0
+        end = np.searchsorted(self.timestamps, to_timestamp(end_date), 'right') if end_date else self._size
+        return RankSeries(self.timestamps[start:end], self.ranks[start:end])
+
+class RankStore:
+    # Append-only rank history in SQLite. The timestamp is the primary key, so range
+    # queries and the last entry are index lookups instead of reading every backup.
+    def __init__(self, path=None):
+        path = path or os.getenv('RANK_STORE_PATH', DEFAULT_RANK_STORE_PATH)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS ranks (
+                timestamp INTEGER PRIMARY KEY,
+                rank INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS rollups (
+                interval TEXT NOT NULL,
+                period INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                sum INTEGER NOT NULL,
+                min INTEGER NOT NULL,
+                max INTEGER NOT NULL,
+                first_timestamp INTEGER NOT NULL,
+                first_rank INTEGER NOT NULL,
+                last_timestamp INTEGER NOT NULL,
+                last_rank INTEGER NOT NULL,
+                best_timestamp INTEGER NOT NULL,
+                worst_timestamp INTEGER NOT NULL,
+                PRIMARY KEY (interval, period)
+            ) WITHOUT ROWID;
+        """)
+        if self.get_meta('rollup_version') != str(ROLLUP_VERSION):
+            # Stores from before the rollups (or with older columns) get them built once
+            with self.connection:
+                self.connection.execute("DELETE FROM rollups")
+                first, last = self.connection.execute("SELECT MIN(timestamp), MAX(timestamp) FROM ranks").fetchone()
+                if first is not None:
+                    self._recompute_rollups(first, last)
+                self._write_meta('rollup_version', ROLLUP_VERSION)
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM ranks").fetchone()[0]
+
+    def append(self, timestamps, ranks, replace=False, meta=None):
+        # timestamps are epoch seconds, already stored timestamps are kept unless
+        # replace. meta keys are written in the same transaction, so a sync
+        # checkpoint never gets ahead of the rows it covers.
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        ranks = np.asarray(ranks, dtype=np.int64)
+        with self.connection:
+            cursor = self.connection.executemany(
+                f"{verb} INTO ranks (timestamp, rank) VALUES (?, ?)",
+                zip(timestamps.tolist(), ranks.tolist()))
+            if len(timestamps) and not replace and cursor.rowcount == len(timestamps):
+                # Only new samples, so they fold into the stored rollups
+                order = np.argsort(timestamps, kind='stable')
+                self._merge_rollups(timestamps[order], ranks[order])
+            elif len(timestamps):
+                # Some samples were replaced or skipped, redo the periods they touch
+                self._recompute_rollups(int(timestamps.min()), int(timestamps.max()))
+            for key, value in (meta or {}).items():
+                self._write_meta(key, value)
+        return cursor.rowcount
+
+    def _recompute_rollups(self, first, last):
+        # Rebuilds the rollups of every period overlapping [first, last] from the samples
+        query = "SELECT timestamp, rank FROM ranks WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp"
+        for interval in ROLLUP_INTERVALS:
+            low, high = period_ids(np.array([first, last], dtype=np.int64), interval).tolist()
+            self.connection.execute("DELETE FROM rollups WHERE interval = ? AND period >= ? AND period <= ?",
+                                    (interval, low, high))
+            timestamps, ranks = self._read_arrays(query, (int(period_start(low, interval)), int(period_start(high + 1, interval))))
+            self._write_rollups(interval, summarize_periods(timestamps, ranks, interval))
+
+    def _merge_rollups(self, timestamps, ranks):
+        # Folds new samples into the stored rollups, touching only the periods they fall in
+        for interval in ROLLUP_INTERVALS:
+            summary = summarize_periods(timestamps, ranks, interval)
+            stored = {row[0]: row[1:] for row in self.connection.execute(
+                f"SELECT period, {', '.join(ROLLUP_COLUMNS)} FROM rollups WHERE interval = ? AND period >= ? AND period <= ?",
+                (interval, int(summary['period'][0]), int(summary['period'][-1])))}
+            rows = []
+            for row in zip(*(summary[column].tolist() for column in ('period',) + ROLLUP_COLUMNS)):
+                new = dict(zip(ROLLUP_COLUMNS, row[1:]))
+                if row[0] in stored:
+                    new = merge_rollup(dict(zip(ROLLUP_COLUMNS, stored[row[0]])), new)
+                rows.append((interval, row[0]) + tuple(new[column] for column in ROLLUP_COLUMNS))
+            self._write_rollup_rows(rows)
+
+    def _write_rollups(self, interval, summary):
+        self._write_rollup_rows(zip([interval] * len(summary['period']),
+                                    *(summary[column].tolist() for column in ('period',) + ROLLUP_COLUMNS)))
+
+    def _write_rollup_rows(self, rows):
+        self.connection.executemany(
+            f"INSERT OR REPLACE INTO rollups (interval, period, {', '.join(ROLLUP_COLUMNS)}) "
+            f"VALUES (?, ?{', ?' * len(ROLLUP_COLUMNS)})", rows)
+
+    def _read_arrays(self, query, parameters):
+        rows = self.connection.execute(query, parameters).fetchall()
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        timestamps, ranks = np.array(rows, dtype=np.int64).T
+        return timestamps, ranks
+
+    def period_summary(self, interval, start_date=None, end_date=None):
+        # Per-period count, sum, mean, min, max, first, last and the timestamps of the
+        # best and worst rank, for the samples between start_date and end_date (both
+        # inclusive). Whole periods come from the rollups, only the partial periods at
+        # the ends of the range are computed from samples.
+        start = to_timestamp(start_date) if start_date else None
+        end = to_timestamp(end_date) if end_date else None
+        low = high = None
+        if start is not None:
+            low = int(period_ids(np.array([start]), interval)[0])
+            low += int(period_start(low, interval)) != start
+        if end is not None:
+            high = int(period_ids(np.array([end]), interval)[0])
+            high -= int(period_start(high + 1, interval)) - 1 != end
+
+        query = f"SELECT period, {', '.join(ROLLUP_COLUMNS)} FROM rollups WHERE interval = ? AND period >= ? AND period <= ? ORDER BY period"
+        rows = self.connection.execute(query, (interval, -2 ** 63 if low is None else low, 2 ** 63 - 1 if high is None else high)).fetchall()
+        whole = {column: np.array([row[index] for row in rows], dtype=np.int64)
+                 for index, column in enumerate(('period',) + ROLLUP_COLUMNS)}
+
+        sample_query = "SELECT timestamp, rank FROM ranks WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp"
+        parts = [whole]
+        if start is not None:
+            before = summarize_periods(*self._read_arrays(sample_query, (start, int(period_start(low, interval)))), interval)
+            parts.insert(0, before)
+        if end is not None:
+            after = summarize_periods(*self._read_arrays(sample_query, (int(period_start(high + 1, interval)), end + 1)), interval)
+            parts.append(after)
+        if start is not None and end is not None and low > high:
+            # The whole range sits inside a single period
+            parts = [summarize_periods(*self._read_arrays(sample_query, (start, end + 1)), interval)]
+        summary = {column: np.concatenate([part[column] for part in parts]) for column in parts[0]}
+        summary['mean'] = summary['sum'] / np.maximum(summary['count'], 1)
+        return summary
+
+    def last(self):
+        row = self.connection.execute("SELECT timestamp, rank FROM ranks ORDER BY timestamp DESC LIMIT 1").fetchone()
+        return (from_timestamp(row[0]), row[1]) if row else (None, None)
+
+    def range(self, start_date=None, end_date=None, chunk_size=65536):
+        # RankSeries of the samples between start_date and end_date, both inclusive,
+        # filled a chunk of rows at a time
+        query = "SELECT timestamp, rank FROM ranks WHERE timestamp >= ? AND timestamp <= ? ORDER BY timestamp"
+        start = to_timestamp(start_date) if start_date else -2 ** 63
+        end = to_timestamp(end_date) if end_date else 2 ** 63 - 1
+        series = RankSeries()
+        cursor = self.connection.execute(query, (start, end))
+        while rows := cursor.fetchmany(chunk_size):
+            timestamps, ranks = np.array(rows, dtype=np.int64).T
+            series.extend(timestamps, ranks)
+        return series
+
+    def get_meta(self, key, default=None):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self.connection:
+            self._write_meta(key, value)
+
+    def _write_meta(self, key, value):
+        if value is None:
+            self.connection.execute("DELETE FROM meta WHERE key = ?", (key,))
+        else:
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def copy_to(self, filename):
+        # Consistent copy of the whole store, used for the channel backup
+        target = sqlite3.connect(filename)
+        with target:
+            self.connection.backup(target)
+        target.close()
+
+    def close(self):
+        self.connection.close()
+
+def merge_ranks(parts):
+    # Concatenates (timestamps, ranks) array pairs and sorts them by timestamp in one
+    # pass; a repeated timestamp keeps its first occurrence, like the store does
+    parts = list(parts)
+    if not parts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    timestamps = np.concatenate([np.asarray(part[0], dtype=np.int64) for part in parts])
+    ranks = np.concatenate([np.asarray(part[1], dtype=np.int64) for part in parts])
+    timestamps, first = np.unique(timestamps, return_index=True)
+    return timestamps, ranks[first]
+
+def import_legacy_csv(store):
+    # One-time import of the newest backup_<ts>.csv written before the rank store existed.
+    # The whole file goes in, the requested date range is applied when reading the store.
+    latest_csv_path = get_latest_csv_file()
+    if latest_csv_path and len(store) == 0:
+        print(f"Importing latest CSV file into the rank store: {latest_csv_path}")
+        try:
+            timestamps, ranks = merge_ranks([read_from_csv(latest_csv_path)])
+            imported = store.append(timestamps, ranks)
+            print(f"Imported {imported} entries")
+        except Exception as e:
+            print(f"Error reading CSV file: {e}")
+
+async def fetch_messages(channel, start_date, end_date, store, fresh=False):
+    # Pages backward through the log channel from the newest message and appends
+    # every parsed rank to the store as each page arrives. Used for the first sync
+    # and --fresh, later runs use sync_messages. The walk is checkpointed after
+    # every page, an interrupted walk continues from where it stopped.
+    # The walk always goes back to the stored data or the start of the channel:
+    # later syncs only move forward, so anything skipped here would never be
+    # fetched. start_date and end_date only label the progress output.
+    # Returns how many entries were new.
+    import discord
+    added = 0
+    record_high_water = False
+    last_message_id = store.get_meta('backfill_before')
+    if last_message_id is not None:
+        last_message_id = int(last_message_id)
+        stop_at = store.get_meta('backfill_until')
+        last_stored_date = from_timestamp(int(stop_at)) if stop_at else None
+        fresh = store.get_meta('backfill_fresh') == '1'
+        print(f"Resuming the interrupted sync before message {last_message_id}")
+    else:
+        if not fresh:
+            import_legacy_csv(store)
+        last_stored_date = None if fresh else store.last()[0]
+        store.set_meta('backfill_until', to_timestamp(last_stored_date) if last_stored_date else None)
+        store.set_meta('backfill_fresh', 1 if fresh else 0)
+        record_high_water = True
+    if last_stored_date:
+        print(f"Last entry in the rank store is at {last_stored_date}")
+    last_stored = to_timestamp(last_stored_date) if last_stored_date else None
+    start = to_timestamp(start_date) if start_date else None
+    end = to_timestamp(end_date) if end_date else None
 
     while True:
         new_messages = []
@@ -52,20 +340,34 @@ async def fetch_messages(channel, start_date, end_date, fresh=False):
             print("No more messages found.")
             break
 
-        found_new_messages_between_dates = False
+        # Newest first, like the page
+        page_timestamps, page_ranks = parse_messages([message.content for message in new_messages])
+        timestamps, ranks = page_timestamps, page_ranks
 
-        for message in new_messages:
-            message_date = parse_message(message.content)[0]
-            if message_date:
-                if last_csv_date and message_date <= last_csv_date.utcnow():
-                    print("Reached messages that are older than or equal to the last CSV entry. Stopping...")
-                    break
-                if (not start_date or message_date >= start_date) and (not end_date or message_date <= end_date):
-                    found_new_messages_between_dates = True
-                    messages.append(message)
+        reached_stored = False
+        if last_stored is not None:
+            older = np.flatnonzero(timestamps <= last_stored)
+            if older.size:
+                print("Reached messages that are older than or equal to the last stored entry. Stopping...")
+                reached_stored = True
+                timestamps, ranks = timestamps[:older[0]], ranks[:older[0]]
 
-        first_message_date = parse_message(new_messages[0].content)[0]
-        last_message_date = parse_message(new_messages[-1].content)[0]
+        in_range = np.ones(len(timestamps), dtype=bool)
+        if start is not None:
+            in_range &= timestamps >= start
+        if end is not None:
+            in_range &= timestamps <= end
+        found_new_messages_between_dates = bool(in_range.any())
+
+        checkpoint = {'backfill_before': new_messages[-1].id}
+        if record_high_water:
+            # The newest message is where the forward sync picks up next time
+            checkpoint['last_message_id'] = new_messages[0].id
+            record_high_water = False
+        added += store.append(timestamps, ranks, replace=fresh, meta=checkpoint)
+
+        first_message_date = from_timestamp(int(page_timestamps[0])) if len(page_timestamps) else None
+        last_message_date = from_timestamp(int(page_timestamps[-1])) if len(page_timestamps) else None
 
         print(f'Searching between {first_message_date} and {last_message_date}...')
         if found_new_messages_between_dates:
@@ -73,26 +375,126 @@ async def fetch_messages(channel, start_date, end_date, fresh=False):
 
         last_message_id = new_messages[-1].id
 
-        if start_date and last_message_date < start_date:
-            print("Reached messages older than the start date. Stopping...")
-            break  # Stop if we've reached messages older than the start date
+        if reached_stored:
+            break
+
+    store.append([], [], meta={'backfill_before': None, 'backfill_until': None, 'backfill_fresh': None})
+    return added
+
+async def sync_messages(channel, store):
+    # Forward sync from the last ingested message id, oldest first, so the work is
+    # proportional to the number of new messages. The high-water mark is saved with
+    # each page, an interrupted sync continues from the last stored page.
+    # Returns how many entries were new.
+    import discord
+    added = 0
+    after_id = int(store.get_meta('last_message_id'))
+    while True:
+        new_messages = []
+        async for message in channel.history(limit=100, after=discord.Object(id=after_id), oldest_first=True):
+            new_messages.append(message)
+
+        if not new_messages:
+            break
+
+        timestamps, ranks = parse_messages([message.content for message in new_messages])
+        after_id = new_messages[-1].id
+        added += store.append(timestamps, ranks, meta={'last_message_id': after_id})
+        if len(timestamps):
+            print(f"Synced {len(new_messages)} messages up to {from_timestamp(int(timestamps[-1]))}")
+
+        if len(new_messages) < 100:
+            break
+
+    return added
+
+async def sync_store(channel, store, start_date=None, end_date=None, fresh=False):
+    # Forward incremental sync once a high-water mark exists, the backward walk otherwise
+    added = 0
+    if fresh or store.get_meta('last_message_id') is None or store.get_meta('backfill_before') is not None:
+        added = await fetch_messages(channel, start_date, end_date, store, fresh)
+    if store.get_meta('last_message_id') is None:
+        return added  # Empty channel
+    return added + await sync_messages(channel, store)
+
+def snowflake_windows(start, end, count):
+    # Splits [start, end] into `count` consecutive (after, before) snowflake id ranges
+    import discord
+    first = discord.utils.time_snowflake(start, high=False)
+    last = discord.utils.time_snowflake(end, high=True) + 1
+    step = max((last - first) // count, 1)
+    bounds = list(range(first, last, step))[:count] + [last]
+    # Window i holds ids in [bounds[i], bounds[i + 1]), history() bounds are exclusive
+    return [(low - 1, high) for low, high in zip(bounds, bounds[1:])]
+
+async def fetch_window(channel, after, before, semaphore):
+    # Ranks of all messages with after < id < before, oldest first, and the newest id
+    import discord
+    contents = []
+    last_id = None
+    async with semaphore:
+        async for message in channel.history(limit=None, after=discord.Object(id=after), before=discord.Object(id=before), oldest_first=True):
+            contents.append(message.content)
+            last_id = message.id
+    timestamps, ranks = parse_messages(contents)
+    return timestamps, ranks, last_id
+
+async def backfill_messages(channel, store, start_date=None, end_date=None, concurrency=4):
+    # Cold rebuild of the store: the date range is split into snowflake id windows
+    # fetched by at most `concurrency` tasks at once (discord.py still applies the
+    # rate limits), then merged in message order and stored in one transaction.
+    from tqdm import tqdm
+    start = (start_date.astimezone(timezone.utc) if start_date else channel.created_at)
+    end = end_date.astimezone(timezone.utc) if end_date else datetime.now(timezone.utc)
+    windows = snowflake_windows(start, end, concurrency * BACKFILL_WINDOWS_PER_TASK)
+    print(f"Backfilling {start:%Y-%m-%d} to {end:%Y-%m-%d} in {len(windows)} windows with {concurrency} tasks")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    progress_bar = tqdm(total=len(windows), desc="Backfilling windows")
+
+    async def fetch(window):
+        result = await fetch_window(channel, *window, semaphore)
+        progress_bar.update(1)
+        return result
+
+    results = await asyncio.gather(*(fetch(window) for window in windows))
+    progress_bar.close()
+
+    # Windows do not overlap and come back in window order, so repeated timestamps
+    # keep their oldest message
+    timestamps, ranks = merge_ranks(window[:2] for window in results)
+    last_id = max((window[2] for window in results if window[2] is not None), default=None)
 
-    return messages
+    meta = {}
+    high_water = store.get_meta('last_message_id')
+    if last_id is not None and not end_date and (high_water is None or last_id > int(high_water)):
+        meta['last_message_id'] = last_id
+    return store.append(timestamps, ranks, meta=meta)
 
-# Function to parse date, time, and rank from message content
-def parse_message(message_content):
-    match = re.match(r"(\d{2}/\d{2}/\d{4})-(\d{2}:\d{2}:\d{2}) - Rank: (\d+)", message_content)
-    if match:
-        date_str, time_str, rank = match.groups()
-        date_time_str = f"{date_str} {time_str}"
-        date_time = datetime.strptime(date_time_str, '%d/%m/%Y %H:%M:%S')
-        rank = int(rank)
-        return date_time, rank
-    return None, None
+# Log lines look like "31/12/2024-18:30:00 - Rank: 123", one per line (the lambda
+# can join several into one message)
+RANK_LOG_PATTERN = re.compile(r"^(\d{2})/(\d{2})/(\d{4})-(\d{2}):(\d{2}):(\d{2}) - Rank: (\d+)", re.MULTILINE)
 
+# Function to parse date, time, and rank from a batch of message contents
+def parse_messages(message_contents):
+    # Returns (epoch seconds as int64, ranks as int64) in message order, in one
+    # regex pass over all contents and array arithmetic for the dates
+    fields = RANK_LOG_PATTERN.findall("\n".join(message_contents))
+    if not fields:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    # One numeric parse of every field instead of an int() per field
+    values = np.fromstring(" ".join(map(" ".join, fields)), dtype=np.int64, sep=" ")
+    day, month, year, hour, minute, second, rank = values.reshape(-1, 7).T
 
-def save_to_csv(df, filename=f'backup/backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'):
-    df.to_csv(filename, index=False)
+    # Same validation strptime did, invalid dates are dropped
+    valid = (month >= 1) & (month <= 12) & (hour < 24) & (minute < 60) & (second < 60) & (day >= 1)
+    months = ((year - 1970) * 12 + np.clip(month, 1, 12) - 1).astype('datetime64[M]')
+    days_in_month = ((months + 1).astype('datetime64[D]') - months.astype('datetime64[D]')).astype(np.int64)
+    valid &= day <= days_in_month
+
+    days = months.astype('datetime64[D]').astype(np.int64) + day - 1
+    timestamps = days * 86400 + hour * 3600 + minute * 60 + second
+    return timestamps[valid], rank[valid]
 
 
 def get_latest_csv_file():
@@ -104,31 +506,101 @@ def get_latest_csv_file():
 
 
 def read_from_csv(filename):
-    return pd.read_csv(filename, parse_dates=['DateTime'])
+    # (timestamps, ranks) arrays of a backup CSV, rows with an unreadable date or rank are dropped
+    import pandas as pd
+    csv_data = pd.read_csv(filename, usecols=['DateTime', 'Rank'], dtype={'DateTime': str})
+    date_times = pd.to_datetime(csv_data['DateTime'], format='ISO8601', errors='coerce')
+    ranks = pd.to_numeric(csv_data['Rank'], errors='coerce')
+    valid = (date_times.notna() & ranks.notna()).to_numpy()
+    timestamps = date_times.to_numpy(dtype='datetime64[s]')[valid].astype(np.int64)
+    return timestamps, ranks.to_numpy()[valid].astype(np.int64)
 
 
-def get_last_from_csv(filename):
-    df = read_from_csv(filename)
-    return df.iloc[-1]['DateTime'], df.iloc[-1]['Rank']
+async def send_backup_to_channel(channel, store):
+    # Upload a copy of the rank store to the backup channel
+    import discord
+    backup_path = os.path.join('backup', f'ranks_{datetime.now().strftime("%Y%m%d_%H%M%S")}.sqlite3')
+    print(f"Uploading rank store backup: {backup_path}")
+    try:
+        store.copy_to(backup_path)
+        with open(backup_path, 'rb') as file:
+            await channel.send(content=f"Backup rank store {datetime.now()}", file=discord.File(file))
+    except Exception as e:
+        print(f"Error uploading rank store backup: {e}")
+    finally:
+        if os.path.exists(backup_path):
+            os.remove(backup_path)
 
-async def send_backup_to_channel(channel):
-    # get the latest csv file and upload it to the backup channel
-    latest_csv_path = get_latest_csv_file()
-    if latest_csv_path:
-        print(f"Uploading latest CSV file: {latest_csv_path}")
-        try:
-            with open(latest_csv_path, 'rb') as file:
-                await channel.send(content=f"Backup CSV file {datetime.now()}", file=discord.File(file))
-        except Exception as e:
-            print(f"Error uploading CSV file: {e}")
+def render_name(inverted=False, detailed=False):
+    # Readable part of a render's file name, from the date range and options
+    return f'{"GENERAL" if not args.start_date and not args.end_date else ( f"{args.start_date}___{args.end_date}" if args.start_date and args.end_date else f"FROM___{args.start_date}" if args.start_date else f"UNTIL___{args.end_date}")}___{"inverted_" if inverted else "normal_"}{"detailed_" if detailed else ""}{"zoomed_in_" if args.zoomed_in else ""}rank_evolution'
 
-# Function to plot rank evolution over time
-def plot_rank_evolution(df, inverted=False, detailed=False):
-    plt.figure(figsize=(19.2, 10.8))
-    plt.plot(df['DateTime'], df['Rank'], linestyle='-', marker='')
+def render_key(series, options):
+    # Content address of a render: the samples it is drawn from and every option that
+    # changes the output
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(json.dumps(dict(options, version=RENDER_VERSION), sort_keys=True).encode())
+    digest.update(series.timestamps.tobytes())
+    digest.update(series.ranks.tobytes())
+    return digest.hexdigest()
+
+RENDER_FILE_PATTERN = re.compile(r"___[0-9a-f]{16}\.(png|mp4)$")
+
+def cached_render(directory, name, extension, series, options, render):
+    # Returns directory/<name>___<key>.<extension>, calling render(path) only when no
+    # render of the same samples and options exists yet. Renders go to a temporary
+    # file first, an interrupted run never leaves a broken file behind.
+    path = os.path.join(directory, f"{name}___{render_key(series, options)}.{extension}")
+    if os.path.exists(path):
+        os.utime(path)  # Eviction removes the least recently used renders first
+        print(f"Reusing cached render {path}")
+        return path
+    os.makedirs(directory, exist_ok=True)
+    partial_path = os.path.join(directory, f"partial_{os.getpid()}.{extension}")
+    try:
+        render(partial_path)
+        os.replace(partial_path, path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    evict_renders(directory, keep=path)
+    return path
 
-    first_date = df['DateTime'].iloc[0]
-    last_date = df['DateTime'].iloc[-1]
+def evict_renders(directory, keep=None, max_bytes=None, max_age=None):
+    # Removes cached renders unused for max_age seconds, then the least recently used
+    # ones until the directory holds at most max_bytes of them
+    if max_bytes is None:
+        max_bytes = int(os.getenv('RENDER_CACHE_MAX_MB', DEFAULT_RENDER_CACHE_MAX_MB)) * 1024 * 1024
+    if max_age is None:
+        max_age = int(os.getenv('RENDER_CACHE_MAX_AGE_DAYS', DEFAULT_RENDER_CACHE_MAX_AGE_DAYS)) * 86400
+    renders = []
+    now = datetime.now().timestamp()
+    for entry in os.scandir(directory):
+        if not RENDER_FILE_PATTERN.search(entry.name) or entry.path == keep:
+            continue
+        stat = entry.stat()
+        if now - stat.st_mtime > max_age:
+            os.remove(entry.path)
+        else:
+            renders.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in renders) + (os.path.getsize(keep) if keep else 0)
+    for _, size, path in sorted(renders):
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
+
+# Function to plot rank evolution over time
+def plot_rank_evolution(series, inverted=False, detailed=False, downsample='minmax', image_path=None, periods=None):
+    # periods maps 'D'/'W'/'M' to the period summaries of the series (RankStore.period_summary),
+    # they are computed from the series when missing
+    import matplotlib.pyplot as plt
+    fig = plt.figure(figsize=(19.2, 10.8))
+    line = downsample_minmax(series, int(fig.get_figwidth() * fig.dpi)) if downsample == 'minmax' else series
+    plt.plot(line.datetimes, line.ranks, linestyle='-', marker='')
+    # Everything below works on the full series, the detailed extrema stay exact
+    first_date = from_timestamp(int(series.timestamps[0]))
+    last_date = from_timestamp(int(series.timestamps[-1]))
     
     total_days = (last_date - first_date).days
 
@@ -138,6 +610,7 @@ def plot_rank_evolution(df, inverted=False, detailed=False):
         interval = 'W'  
     else:
         interval = 'D'
+    summary = periods[interval] if periods else summarize_periods(series.timestamps, series.ranks, interval)
 
     plt.annotate(first_date.strftime('%d %B %Y'), xy=(first_date, 0), xycoords=('data', 'axes fraction'),
                     xytext=(-50, -30), textcoords='offset points', ha='center', fontsize=10, color='blue')
@@ -146,23 +619,18 @@ def plot_rank_evolution(df, inverted=False, detailed=False):
     
     if detailed:
         print("detailing")
-        df['Period'] = df['DateTime'].dt.to_period(interval)
-        period_groups = df.groupby('Period')
-
-        for period, group in period_groups:
-            if not group.empty:
-                max_rank_row = group.loc[group['Rank'].idxmin()]
-                min_rank_row = group.loc[group['Rank'].idxmax()]
+        worst_dates = summary['worst_timestamp'].astype('datetime64[s]')
+        best_dates = summary['best_timestamp'].astype('datetime64[s]')
 
-                # Plot and annotate local min (max rank value)
-                plt.scatter(min_rank_row['DateTime'], min_rank_row['Rank'], color='blue')
-                plt.text(min_rank_row['DateTime'], min_rank_row['Rank'], f"{min_rank_row['Rank']}", 
-                         verticalalignment='top', horizontalalignment='right', color='red')
+        # Plot and annotate local min (max rank value)
+        plt.scatter(worst_dates, summary['max'], color='blue')
+        for date, rank in zip(worst_dates, summary['max']):
+            plt.text(date, rank, f"{rank}", verticalalignment='top', horizontalalignment='right', color='red')
 
-                # Plot and annotate local max (min rank value)
-                plt.scatter(max_rank_row['DateTime'], max_rank_row['Rank'], color='green')
-                plt.text(max_rank_row['DateTime'], max_rank_row['Rank'], f"{max_rank_row['Rank']}", 
-                         verticalalignment='bottom', horizontalalignment='left', color='green')
+        # Plot and annotate local max (min rank value)
+        plt.scatter(best_dates, summary['min'], color='green')
+        for date, rank in zip(best_dates, summary['min']):
+            plt.text(date, rank, f"{rank}", verticalalignment='bottom', horizontalalignment='left', color='green')
 
 
     plt.xlabel('Date and Time')
@@ -171,8 +639,8 @@ def plot_rank_evolution(df, inverted=False, detailed=False):
     plt.grid(True)
     plt.xticks(rotation=45)
     if args.zoomed_in: # TODO: fix for values close to factors of 5
-        min_rank = df['Rank'].min()
-        max_rank = df['Rank'].max()
+        min_rank = summary['min'].min()
+        max_rank = summary['max'].max()
         min_rank = 25 * (min_rank // 25)
         max_rank = 25 * (max_rank // 25 + 1)
         plt.ylim(min_rank, max_rank)
@@ -183,209 +651,447 @@ def plot_rank_evolution(df, inverted=False, detailed=False):
         plt.gca().invert_yaxis()
     
     # Save the plot as an image
-    image_path = f'images/{"GENERAL" if not args.start_date and not args.end_date else ( f"{args.start_date}___{args.end_date}" if args.start_date and args.end_date else f"FROM___{args.start_date}" if args.start_date else f"UNTIL___{args.end_date}")}___{"inverted_" if inverted else "normal_"}{"detailed_" if detailed else ""}{"zoomed_in_" if args.zoomed_in else ""}rank_evolution.png'
+    image_path = image_path or f'images/{render_name(inverted, detailed)}.png'
     plt.savefig(image_path, dpi=100)
     plt.close()
     
     return image_path
 
 
-def create_animation(df, inverted=False, detailed=False, duration=10, zoomed_in=False, start_date=None, end_date=None):
-    fig, ax = plt.subplots(figsize=(19.2, 10.8))
-    line, = ax.plot([], [], linestyle='-', marker='')
-    text = ax.text(0.5, 1.05, '', transform=ax.transAxes, ha='center', fontsize=15)
-    progress_bar = tqdm(total=len(df), desc="Creating animation frames")
-    plotted_min_points = set()
-    plotted_max_points = set()
+def period_ids(timestamps, interval):
+    # Calendar period number of every timestamp: 'D' days, 'W' weeks starting on Monday, 'M' months
+    days = timestamps // 86400
+    if interval == 'M':
+        return timestamps.view('datetime64[s]').astype('datetime64[M]').astype(np.int64)
+    if interval == 'W':
+        return (days + 3) // 7  # 1970-01-01 was a Thursday
+    return days
 
-    # Filter the dataframe based on start_date and end_date if provided
-    if start_date:
-        df = df[df['DateTime'] >= pd.to_datetime(start_date)]
-    if end_date:
-        df = df[df['DateTime'] <= pd.to_datetime(end_date)]
 
-    # Get the first and last date for annotations
-    first_date = df['DateTime'].iloc[0]
-    last_date = df['DateTime'].iloc[-1]
-    
-    # Calculate the total duration in days
-    total_days = (last_date - first_date).days
+def period_start(period, interval):
+    # Epoch seconds at which period number `period` of `interval` starts
+    period = np.asarray(period, dtype=np.int64)
+    if interval == 'M':
+        return period.astype('datetime64[M]').astype('datetime64[s]').astype(np.int64)
+    if interval == 'W':
+        return (period * 7 - 3) * 86400
+    return period * 86400
 
-    # Set the interval for local min/max annotations based on the total duration
-    if total_days > 365:
-        interval = 'M'  # Monthly for more than a year
-    elif total_days > 30:
-        interval = 'W'  # Weekly for more than a month
-    else:
-        interval = 'D'  # Daily otherwise
 
-    df['Period'] = df['DateTime'].dt.to_period(interval)
-    period_min_max = {}
+# Stored per period, next to the period number; the mean is sum / count
+ROLLUP_COLUMNS = ('count', 'sum', 'min', 'max', 'first_timestamp', 'first_rank', 'last_timestamp', 'last_rank',
+                  'best_timestamp', 'worst_timestamp')
+
+def summarize_periods(timestamps, ranks, interval):
+    # Rollup columns of every period in time-ordered samples, as arrays in period order
+    if not len(timestamps):
+        return {column: np.empty(0, dtype=np.int64) for column in ('period',) + ROLLUP_COLUMNS}
+    ids = period_ids(timestamps, interval)
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    ends = np.r_[starts[1:], len(ids)] - 1
+    best, worst = group_extrema(ranks, ids)
+    ranks = np.asarray(ranks, dtype=np.int64)
+    return {
+        'period': ids[starts], 'count': ends - starts + 1, 'sum': np.add.reduceat(ranks, starts),
+        'min': ranks[best], 'max': ranks[worst],
+        'first_timestamp': timestamps[starts], 'first_rank': ranks[starts],
+        'last_timestamp': timestamps[ends], 'last_rank': ranks[ends],
+        'best_timestamp': timestamps[best], 'worst_timestamp': timestamps[worst],
+    }
+
+def merge_rollup(old, new):
+    # Rollup of a period from the rollups of two disjoint sets of its samples; ties keep
+    # the earlier sample, like group_extrema
+    merged = {'count': old['count'] + new['count'], 'sum': old['sum'] + new['sum']}
+    first = old if old['first_timestamp'] <= new['first_timestamp'] else new
+    merged.update(first_timestamp=first['first_timestamp'], first_rank=first['first_rank'])
+    last = new if new['last_timestamp'] >= old['last_timestamp'] else old
+    merged.update(last_timestamp=last['last_timestamp'], last_rank=last['last_rank'])
+    best = min((old['min'], old['best_timestamp']), (new['min'], new['best_timestamp']))
+    worst = min((-old['max'], old['worst_timestamp']), (-new['max'], new['worst_timestamp']))
+    merged.update(min=best[0], best_timestamp=best[1], max=-worst[0], worst_timestamp=worst[1])
+    return merged
+
+
+def group_extrema(ranks, groups):
+    # Indices of the first best (lowest) and first worst (highest) rank of every run of
+    # equal, sorted group ids, in one pass over the arrays
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    group_index = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(ranks)]))
+
+    def first_equal(values):
+        hits = np.flatnonzero(ranks == values[group_index])
+        return hits[np.r_[True, group_index[hits][1:] != group_index[hits][:-1]]]
+
+    return first_equal(np.minimum.reduceat(ranks, starts)), first_equal(np.maximum.reduceat(ranks, starts))
+
+
+def downsample_minmax(series, buckets):
+    # Keeps the first, last, best and worst sample of each of `buckets` equal time
+    # slices (about one per pixel column), so the line keeps every peak and trough
+    if len(series) <= 4 * buckets:
+        return series
+    timestamps = series.timestamps
+    span = max(int(timestamps[-1] - timestamps[0]), 1)
+    bucket_ids = (timestamps - timestamps[0]) * buckets // span
+    starts = np.flatnonzero(np.r_[True, bucket_ids[1:] != bucket_ids[:-1]])
+    ends = np.r_[starts[1:] - 1, len(timestamps) - 1]
+    best, worst = group_extrema(series.ranks, bucket_ids)
+    keep = np.unique(np.concatenate([starts, ends, best, worst]))
+    return RankSeries(timestamps[keep], series.ranks[keep])
+
+
+def plan_animation(series, duration, summary, fps=ANIMATION_FPS):
+    # Picks the samples each frame ends on (at most duration * fps, plus the period
+    # extrema so none of them is skipped) and the line vertices: every frame end and
+    # the best and worst sample between two frames, so decimation keeps the shape.
+    # Returns (frames, vertices, best, worst), all sample indices in time order.
+    count = len(series)
+    best = np.searchsorted(series.timestamps, summary['best_timestamp'])
+    worst = np.searchsorted(series.timestamps, summary['worst_timestamp'])
+    budget = max(int(duration * fps), 1)
+    if count <= budget:
+        frames = np.arange(count)
+        return frames, frames, best, worst
+
+    frames = np.union1d(np.linspace(0, count - 1, budget).astype(np.int64), np.r_[best, worst])
+    span_best, span_worst = group_extrema(series.ranks, np.searchsorted(frames, np.arange(count)))
+    vertices = np.unique(np.concatenate([frames, span_best, span_worst]))
+    return frames, vertices, best, worst
+
+
+class AnimationRenderer:
+    # Draws any frame of the rank animation on its own Agg figure. A frame only depends
+    # on its index (the line and the reached extrema are prefixes of arrays computed
+    # once here), so worker processes can each render a different part of the video.
+    def __init__(self, series, inverted=False, detailed=False, duration=10, zoomed_in=False, periods=None):
+        import matplotlib.dates as mdates
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        self.timestamps, self.ranks = series.timestamps, series.ranks
+
+        # Get the first and last date for annotations
+        first_date = from_timestamp(int(self.timestamps[0]))
+        last_date = from_timestamp(int(self.timestamps[-1]))
+
+        # Calculate the total duration in days
+        total_days = (last_date - first_date).days
+
+        # Set the interval for local min/max annotations based on the total duration
+        if total_days > 365:
+            interval = 'M'  # Monthly for more than a year
+        elif total_days > 30:
+            interval = 'W'  # Weekly for more than a month
+        else:
+            interval = 'D'  # Daily otherwise
+
+        summary = periods[interval] if periods else summarize_periods(self.timestamps, self.ranks, interval)
+        self.frames, vertices, best, worst = plan_animation(series, duration, summary)
+        dates = mdates.date2num(series.datetimes)
+        self.vertex_dates, self.vertex_ranks = dates[vertices], self.ranks[vertices]
+        self.vertex_counts = np.searchsorted(vertices, self.frames, 'right')
 
-    for period, group in df.groupby('Period'):
-        if not group.empty:
-            max_rank_row = group.loc[group['Rank'].idxmin()]
-            min_rank_row = group.loc[group['Rank'].idxmax()]
-            period_min_max[period] = {
-                'min': min_rank_row,
-                'max': max_rank_row
-            }
+        self.figure = Figure(figsize=(19.2, 10.8), dpi=100)
+        self.canvas = FigureCanvasAgg(self.figure)
+        ax = self.figure.add_subplot()
+        self.line, = ax.plot([], [], linestyle='-', marker='')
+        self.text = ax.text(0.5, 1.05, '', transform=ax.transAxes, ha='center', fontsize=15)
 
-    def init():
-        ax.set_xlim(df['DateTime'].min(), df['DateTime'].max())
+        ax.xaxis_date()
+        ax.set_xlim(dates[0], dates[-1])
 
+        min_rank = int(summary['min'].min())
+        max_rank = int(summary['max'].max())
         if zoomed_in:
-            min_rank = df['Rank'].min()
-            max_rank = df['Rank'].max()
             min_rank = 25 * (min_rank // 25)
             max_rank = 25 * (max_rank // 25 + 1)
             ax.set_ylim(min_rank, max_rank)
         else:
-            min_rank = df['Rank'].min()
-            max_rank = df['Rank'].max()
-            buffer = (max_rank - min_rank) * 0.1  
+            buffer = (max_rank - min_rank) * 0.1
             ax.set_ylim(min_rank - buffer, max_rank + buffer)
 
-        ax.grid(True)  
+        ax.grid(True)
 
-        ax.annotate(first_date.strftime('%d %B %Y'), xy=(first_date, 0), xycoords=('data', 'axes fraction'),
+        ax.annotate(first_date.strftime('%d %B %Y'), xy=(dates[0], 0), xycoords=('data', 'axes fraction'),
                     xytext=(0, -30), textcoords='offset points', ha='center', fontsize=10, color='blue')
-        ax.annotate(last_date.strftime('%d %B %Y'), xy=(last_date, 0), xycoords=('data', 'axes fraction'),
+        ax.annotate(last_date.strftime('%d %B %Y'), xy=(dates[-1], 0), xycoords=('data', 'axes fraction'),
                     xytext=(0, -30), textcoords='offset points', ha='center', fontsize=10, color='blue')
 
         if inverted:
             ax.invert_yaxis()
-        return line, text
-    def update(frame):
-        current_time = df['DateTime'].iloc[frame]
-        current_rank = df['Rank'].iloc[frame]
-        text.set_text(f"{current_time.strftime('%d %B %Y, %H:%M')}, Rank: {current_rank}")
-        xdata = df['DateTime'].iloc[:frame + 1]
-        ydata = df['Rank'].iloc[:frame + 1]
-        line.set_data(xdata, ydata)
-
-        if detailed:
-            current_period = df['DateTime'].dt.to_period(interval).iloc[frame]
-
-        if current_period in period_min_max:
-            min_rank = period_min_max[current_period]['min']
-            max_rank = period_min_max[current_period]['max']
-
-            # Plot min rank when the timeline reaches or passes the min point
-            if (current_period, min_rank['DateTime']) not in plotted_min_points and current_time >= min_rank['DateTime']:
-                ax.scatter(min_rank['DateTime'], min_rank['Rank'], color='blue')
-                ax.text(min_rank['DateTime'], min_rank['Rank'], f"{min_rank['Rank']}",
-                        verticalalignment='top', horizontalalignment='right', color='red')
-                plotted_min_points.add((current_period, min_rank['DateTime']))
-
-            # Plot max rank when the timeline reaches or passes the max point
-            if (current_period, max_rank['DateTime']) not in plotted_max_points and current_time >= max_rank['DateTime']:
-                ax.scatter(max_rank['DateTime'], max_rank['Rank'], color='green')
-                ax.text(max_rank['DateTime'], max_rank['Rank'], f"{max_rank['Rank']}",
-                        verticalalignment='bottom', horizontalalignment='left', color='green')
-                plotted_max_points.add((current_period, max_rank['DateTime']))
 
-        progress_bar.update(1)
-        return line, text
+        # Period min and max points, each kind shown up to the last one the timeline reached
+        self.extrema = []
+        for points, color, label_options in (
+                (best if detailed else best[:0], 'green', dict(verticalalignment='bottom', horizontalalignment='left', color='green')),
+                (worst if detailed else worst[:0], 'blue', dict(verticalalignment='top', horizontalalignment='right', color='red'))):
+            offsets = np.column_stack([dates[points], self.ranks[points]])
+            markers = ax.scatter([], [], color=color)
+            labels = [ax.text(x, y, f"{int(y)}", visible=False, **label_options) for x, y in offsets]
+            self.extrema.append([points, offsets, markers, labels, 0])
+
+    @property
+    def frame_count(self):
+        return len(self.frames)
+
+    @property
+    def size(self):
+        return self.canvas.get_width_height(physical=True)
+
+    def render(self, frame):
+        # Raw RGB bytes of one frame, rows top to bottom
+        index = self.frames[frame]
+        current_time = from_timestamp(int(self.timestamps[index]))
+        self.text.set_text(f"{current_time.strftime('%d %B %Y, %H:%M')}, Rank: {self.ranks[index]}")
+        self.line.set_data(self.vertex_dates[:self.vertex_counts[frame]], self.vertex_ranks[:self.vertex_counts[frame]])
+
+        for extremum in self.extrema:
+            points, offsets, markers, labels, shown = extremum
+            reached = np.searchsorted(points, index, 'right')
+            if reached != shown:
+                markers.set_offsets(offsets[:reached])
+                for label in labels[min(shown, reached):max(shown, reached)]:
+                    label.set_visible(reached > shown)
+                extremum[4] = reached
+
+        self.canvas.draw()
+        return np.asarray(self.canvas.buffer_rgba())[:, :, :3].tobytes()
+
+    def render_frames(self, first, last):
+        return b''.join(self.render(frame) for frame in range(first, last))
+
+
+# Each animation worker process keeps one renderer, built from the pickled series once
+_animation_renderer = None
+
+def _init_animation_worker(*renderer_args):
+    global _animation_renderer
+    _animation_renderer = AnimationRenderer(*renderer_args)
 
-    fps = len(df) / duration
-    anim = FuncAnimation(fig, update, frames=len(df), init_func=init, blit=False, repeat=False)
+def _render_animation_frames(first, last):
+    return _animation_renderer.render_frames(first, last)
+
+
+def create_animation(series, inverted=False, detailed=False, duration=10, zoomed_in=False, start_date=None, end_date=None, workers=None, video_path=None, periods=None):
+    import matplotlib
+    from tqdm import tqdm
+
+    # Filter the series based on start_date and end_date if provided, periods (as for
+    # plot_rank_evolution) describe the unfiltered series
+    if start_date or end_date:
+        import pandas as pd
+        series = series.between(pd.to_datetime(start_date) if start_date else None,
+                                pd.to_datetime(end_date) if end_date else None)
+        periods = None
+    renderer = AnimationRenderer(series, inverted, detailed, duration, zoomed_in, periods)
+    frame_count = renderer.frame_count
+    width, height = renderer.size
+    fps = frame_count / duration
 
     # Save the animation as a video
-    video_path = f'videos/{"GENERAL" if not args.start_date and not args.end_date else ( f"{args.start_date}___{args.end_date}" if args.start_date and args.end_date else f"FROM___{args.start_date}" if args.start_date else f"UNTIL___{args.end_date}")}___{"inverted_" if inverted else "normal_"}{"detailed_" if detailed else ""}{"zoomed_in_" if args.zoomed_in else ""}rank_evolution.mp4'
-    anim.save(video_path, writer='ffmpeg', fps=fps, dpi=100)
-    progress_bar.close()
-    plt.close(fig)
-    
-    return video_path
+    video_path = video_path or f'videos/{render_name(inverted, detailed)}.mp4'
+
+    # Frames are rendered in chunks by a process pool and piped in order, as raw RGB,
+    # into ffmpeg, which encodes on all cores
+    encoder = subprocess.Popen([
+        matplotlib.rcParams['animation.ffmpeg_path'], '-y', '-loglevel', 'error',
+        '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps), '-i', 'pipe:',
+        '-c:v', matplotlib.rcParams['animation.codec'], '-pix_fmt', 'yuv420p', '-threads', '0', video_path,
+    ], stdin=subprocess.PIPE)
+    chunks = [(first, min(first + ANIMATION_CHUNK_FRAMES, frame_count)) for first in range(0, frame_count, ANIMATION_CHUNK_FRAMES)]
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    progress_bar = tqdm(total=frame_count, desc=f"Creating animation frames ({workers} workers)")
+
+    def write(chunk, frames):
+        encoder.stdin.write(frames)
+        progress_bar.update(chunk[1] - chunk[0])
+
+    try:
+        if workers <= 1:
+            for chunk in chunks:
+                write(chunk, renderer.render_frames(*chunk))
+        else:
+            # spawn rather than fork, the discord client has threads running
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_animation_worker,
+                                     initargs=(series, inverted, detailed, duration, zoomed_in, periods)) as pool:
+                # A bounded window of chunks in flight keeps memory flat when ffmpeg is slower
+                pending = deque()
+                for chunk in chunks:
+                    pending.append((chunk, pool.submit(_render_animation_frames, *chunk)))
+                    if len(pending) >= 2 * workers:
+                        done_chunk, future = pending.popleft()
+                        write(done_chunk, future.result())
+                while pending:
+                    done_chunk, future = pending.popleft()
+                    write(done_chunk, future.result())
+    finally:
+        encoder.stdin.close()
+        progress_bar.close()
+    if encoder.wait() != 0:
+        raise RuntimeError(f"ffmpeg exited with status {encoder.returncode}")
 
+    return video_path
 
 
-@client.event
-async def on_ready():
-    print(f'Logged in as {client.user}')
-    channel = client.get_channel(CHANNEL_ID)
 
-    # Read all messages from the channel
+def parse_date_range(args):
+    # --start_date/--end_date as datetimes covering whole days
     start_date = (
-        datetime.strptime(args.start_date, '%Y-%m-%d') if args.start_date
+        datetime.strptime(args.start_date, '%Y-%m-%d') if getattr(args, 'start_date', None)
         else None)
     if start_date:
         start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
 
     end_date = (
-        datetime.strptime(args.end_date, '%Y-%m-%d') if args.end_date
+        datetime.strptime(args.end_date, '%Y-%m-%d') if getattr(args, 'end_date', None)
         else None)
     if end_date:
         end_date = end_date.replace(hour=23, minute=59, second=59, microsecond=999999)
-    messages = await fetch_messages(channel, start_date, end_date, args.fresh)
+    return start_date, end_date
+
+
+def render(args, video=False):
+    # Plot or video of the rank store over the requested range, reused from the render
+    # cache when the samples and options are unchanged. None when the range is empty.
+    start_date, end_date = parse_date_range(args)
+    store = RankStore()
+    series = store.range(start_date, end_date)
+    # Detailed annotations and axis limits come from the rollups, not a pass over the samples
+    periods = {interval: store.period_summary(interval, start_date, end_date) for interval in ROLLUP_INTERVALS}
+    store.close()
+    if series.empty:
+        return None
+
+    options = {'inverted': args.inverted, 'detailed': args.detailed, 'zoomed_in': args.zoomed_in,
+               'start_date': args.start_date, 'end_date': args.end_date}
+    if video:
+        options.update(kind='video', duration=args.duration)
+        return cached_render(
+            'videos', render_name(args.inverted, args.detailed), 'mp4', series, options,
+            lambda path: create_animation(series, args.inverted, args.detailed, args.duration, workers=args.workers, video_path=path, periods=periods))
+    options.update(kind='plot', downsample=args.downsample)
+    return cached_render(
+        'images', render_name(args.inverted, args.detailed), 'png', series, options,
+        lambda path: plot_rank_evolution(series, args.inverted, args.detailed, args.downsample, image_path=path, periods=periods))
 
-    data = []
+
+async def sync_command(client, args):
+    channel = client.get_channel(int(os.getenv('DISCORD_CHANNEL_ID')))
+    start_date, end_date = parse_date_range(args)
+    store = RankStore()
     try:
-        for message in messages:
-            try:
-                if hasattr(message, 'content') and message.content:
-                    date_time, rank = parse_message(message.content)
-                elif hasattr(message, 'DateTime') and hasattr(message, 'Rank'):
-                    date_time, rank = message.DateTime, message.Rank
-                else:
-                    continue  # Skip the message if it has no usable content
-                
-                if date_time and rank is not None:
-                    data.append((date_time, rank))
-            except Exception as msg_error:
-                print(f"Error parsing message: {msg_error}")
-    except Exception as e:
-        print(f"Error processing messages: {e}")
-        return
-    
-    if args.backup and not start_date and not end_date:
-        df = pd.DataFrame(data, columns=['DateTime', 'Rank'])
-        save_to_csv(df)
-
-        if args.send:
-            await send_backup_to_channel(client.get_channel(CHANNEL_ID_BACKUP))
-
-    if data:
-        df = pd.DataFrame(data, columns=['DateTime', 'Rank'])
-        df.sort_values(by='DateTime', inplace=True)
-        plot_channel = client.get_channel(CHANNEL_ID_PLOTS)
-        if args.video:
-            video_path = create_animation(df, args.inverted, args.detailed, args.duration)
-            today_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            if args.send:
-                message = await plot_channel.send(content=f"{"@here" if args.notify else ""} Rank evolution animation generated on {today_str}", file=discord.File(video_path))
+        if getattr(args, 'backfill', False):
+            added = await backfill_messages(channel, store, start_date, end_date, args.concurrency)
         else:
-            image_path = plot_rank_evolution(df, args.inverted, args.detailed)
-            today_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            if args.send:
-                message = await plot_channel.send(content=f"{"@here" if args.notify else ""} Rank evolution plot generated on {today_str}", file=discord.File(image_path))
-        
-        if args.pin and args.send:
-            await message.pin()
-    
-    await client.close()
+            added = await sync_store(channel, store, start_date, end_date, getattr(args, 'fresh', False))
+        print(f"Stored {added} new entries, {len(store)} in total")
+    finally:
+        store.close()
+
+
+async def backup_command(client, args):
+    # Syncs first, the uploaded copy has every rank logged so far
+    await sync_command(client, args)
+    store = RankStore()
+    try:
+        await send_backup_to_channel(client.get_channel(int(os.getenv('DISCORD_CHANNEL_ID_BACKUP'))), store)
+    finally:
+        store.close()
+
+
+async def send_command(client, args):
+    import discord
+
+    await sync_command(client, args)
+    path = render(args, args.video)
+    if path is None:
+        print("No ranks stored for this date range, nothing to send")
+        return
+
+    plot_channel = client.get_channel(int(os.getenv('DISCORD_CHANNEL_ID_PLOT')))
+    today_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    kind = "animation" if args.video else "plot"
+    message = await plot_channel.send(content=f"{"@here" if args.notify else ""} Rank evolution {kind} generated on {today_str}", file=discord.File(path))
+    if args.pin:
+        await message.pin()
+
+
+async def run_with_client(command, args):
+    # Logs in, runs command(client, args) once the client is ready, then logs out
+    import discord
+
+    intents = discord.Intents.default()
+    intents.messages = True
+    client = discord.Client(intents=intents)
+
+    @client.event
+    async def on_ready():
+        print(f'Logged in as {client.user}')
+        try:
+            await command(client, args)
+        finally:
+            await client.close()
 
-async def main():
     async with client:
-        await client.start(TOKEN)
+        await client.start(os.getenv('DISCORD_BOT_TOKEN'))
+
+
+def load_dependencies(command):
+    # Imports what the subcommand needs up front, a missing package fails before any work
+    for module in COMMAND_DEPENDENCIES[command]:
+        importlib.import_module(module)
+
+
+def build_parser():
+    dates = argparse.ArgumentParser(add_help=False)
+    dates.add_argument('--start_date', '-sd', type=str, help='Start date for the data collection')
+    dates.add_argument('--end_date', '-ed', type=str, help='End date for the data collection')
+
+    plotting = argparse.ArgumentParser(add_help=False)
+    plotting.add_argument('--inverted', '-i', action='store_true', help="Plot the graph in reverse")
+    plotting.add_argument('--detailed', '-d', action='store_true', help="Plot the graph with local min and max for each month")
+    plotting.add_argument('--zoomed_in', '-z', action='store_true', help='Plot the graph with a dynamic, zoomed in y-axis')
+    plotting.add_argument('--downsample', choices=['minmax', 'none'], default='minmax', help='Reduce the plotted line to the min and max of each pixel column (minmax) or plot every sample (none)')
+
+    animation = argparse.ArgumentParser(add_help=False)
+    animation.add_argument('--duration', '-t', type=int, default=10, help="Duration of the animation in seconds")
+    animation.add_argument('--workers', '-w', type=int, help='Processes rendering animation frames, all cores by default')
+
+    syncing = argparse.ArgumentParser(add_help=False)
+    syncing.add_argument('--fresh', '-f', action='store_true', help='Fetch fresh data from Discord')
 
-if __name__ == "__main__":
-    import asyncio
-    
     parser = argparse.ArgumentParser(description="Plot Rank Evolution")
-    parser.add_argument('--inverted', '-i', action='store_true', help="Plot the graph in reverse")
-    parser.add_argument('--detailed', '-d', action='store_true', help="Plot the graph with local min and max for each month")
-    parser.add_argument('--video', '-v', action='store_true', help="Create an animation of the rank evolution")
-    parser.add_argument('--duration', '-t', type=int, default=10, help="Duration of the animation in seconds")
-    parser.add_argument('--pin', '-p', action='store_true', help="Pin the generated plot")
-    parser.add_argument('--send', '-s', action='store_true', help="Send the generated plot")
-    parser.add_argument('--start_date', '-sd', type=str, help='Start date for the data collection')
-    parser.add_argument('--end_date', '-ed', type=str, help='End date for the data collection')
-    parser.add_argument('--zoomed_in', '-z', action='store_true', help='Plot the graph with a dynamic, zoomed in y-axis')
-    parser.add_argument('--backup', '-b', action='store_true', help='Backup the data to a CSV file')
-    parser.add_argument('--fresh', '-f', action='store_true', help='Fetch fresh data from Discord')
-    parser.add_argument('--notify', '-n', action='store_true', help='Notify the users when the plot is generated')
-    args = parser.parse_args()
-    
-    asyncio.run(main())
+    commands = parser.add_subparsers(dest='command', required=True)
+    sync = commands.add_parser('sync', parents=[dates, syncing], help="Store new rank log messages in the rank store")
+    sync.add_argument('--backfill', action='store_true', help='Rebuild the rank store by fetching the date range in parallel windows')
+    sync.add_argument('--concurrency', type=int, default=4, help='Concurrent fetch tasks for --backfill')
+    commands.add_parser('backup', parents=[syncing], help="Sync, then upload a copy of the rank store to the backup channel")
+    commands.add_parser('plot', parents=[dates, plotting], help="Plot the stored rank evolution to images/")
+    commands.add_parser('video', parents=[dates, plotting, animation], help="Animate the stored rank evolution to videos/")
+    send = commands.add_parser('send', parents=[dates, plotting, animation, syncing], help="Sync, then send the plot (or video) to the plot channel")
+    send.add_argument('--video', '-v', action='store_true', help="Send an animation of the rank evolution")
+    send.add_argument('--pin', '-p', action='store_true', help="Pin the generated plot")
+    send.add_argument('--notify', '-n', action='store_true', help='Notify the users when the plot is generated')
+    return parser
+
+
+def main(argv=None):
+    global args
+    from dotenv import load_dotenv
+
+    # Load environment variables from .env file
+    load_dotenv()
+    args = build_parser().parse_args(argv)
+    load_dependencies(args.command)
+
+    if args.command in ('plot', 'video'):
+        path = render(args, args.command == 'video')
+        print(path or "No ranks stored for this date range")
+        return
+    command = {'sync': sync_command, 'backup': backup_command, 'send': send_command}[args.command]
+    asyncio.run(run_with_client(command, args))
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file